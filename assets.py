@@ -0,0 +1,221 @@
+import pygame as pg
+import json
+import mmap
+import os
+import struct
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from settings import *
+
+PACK_MAGIC = b'DHPACK01'
+PACK_ALIGNMENT = 4096  # header and pages start on page boundaries so they map cleanly
+
+
+def align(offset):
+    return -(-offset // PACK_ALIGNMENT) * PACK_ALIGNMENT
+
+
+def find_files(roots, suffix):
+    """Paths of the files under roots ending in suffix, with '/' separators like the game's own paths"""
+    paths = []
+    for root in roots:
+        for folder, _, file_names in os.walk(root):
+            paths += [os.path.join(folder, file_name).replace(os.sep, '/') for file_name in sorted(file_names)
+                      if file_name.lower().endswith(suffix)]
+    return paths
+
+
+class AssetPack:
+    """
+    Atlas pages of raw BGRA pixels written by pack_assets.py, memory-mapped so images are
+    Surfaces over the mapped pixels with no PNG decoding. The index lists each animation
+    folder's frame rectangles with the size and time of the file they came from, and frames
+    whose file changed since packing are left for the caller to decode.
+    """
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            # copy on write, so the surfaces over it can be drawn on like decoded ones
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY)
+        if self.map[:len(PACK_MAGIC)] != PACK_MAGIC:
+            raise ValueError(f'{path} is not an asset pack')
+        index_start = len(PACK_MAGIC) + 4
+        index_length, = struct.unpack_from('<I', self.map, len(PACK_MAGIC))
+        self.index = json.loads(self.map[index_start:index_start + index_length])
+        self.data_start = align(index_start + index_length)
+        self.pages = [None] * len(self.index['pages'])
+
+    def get_page(self, page_id):
+        page = self.pages[page_id]
+        if page is None:
+            offset, width, height = self.index['pages'][page_id]
+            offset += self.data_start
+            page = pg.image.frombuffer(memoryview(self.map)[offset:offset + width * height * 4], (width, height), 'BGRA')
+            display = pg.display.get_surface()
+            # packed in the usual display format, anything else is converted once
+            if display is not None and (display.get_bytesize(), display.get_masks()[:3]) != (4, page.get_masks()[:3]):
+                page = page.convert_alpha()
+            self.pages[page_id] = page
+        return page
+
+    def get_frame(self, path):
+        """Index entry of the packed image for path, or None if it was not packed or its file has changed since"""
+        folder, file_name = path.rsplit('/', 1)
+        frame = self.index['folders'].get(folder, {}).get(file_name)
+        if frame is None:
+            return None
+        try:
+            stat = os.stat(path)
+            if (stat.st_mtime_ns, stat.st_size) != tuple(frame[5:]):
+                return None
+        except FileNotFoundError:
+            pass
+        return frame
+
+    def get_image(self, path):
+        frame = self.get_frame(path)
+        if frame is None:
+            return None
+        page_id, x, y, width, height = frame[:5]
+        return self.get_page(page_id).subsurface((x, y, width, height))
+
+
+class AssetRegistry:
+    """
+    Process-wide images and frame sequences by path, each decoded once and shared by every
+    sprite, NPC and restart that asks for it. The surfaces handed out are shared, so callers
+    treat them as read-only and copy one before drawing on it.
+    """
+    def __init__(self):
+        self.images = {}  # (path, size, smooth) -> Surface
+        self.sequences = {}  # (folder, size, smooth) -> tuple of Surfaces
+        self.sounds = {}  # path -> Sound
+        self.pack = None  # ASSET_PACK, opened on first use if it exists
+        self.pack_checked = False
+        self.decoded = 0  # image files decoded
+        self.packed = 0  # images read from the pack
+        self.requests = 0
+        self.bytes = 0  # pixels of every held surface, scaled variants and mapped pack images included
+
+    def get_image(self, path, size=None, smooth=False):
+        """The image at path, scaled to size if given, loading it on first use"""
+        self.requests += 1
+        key = path, size, smooth
+        image = self.images.get(key)
+        if image is None:
+            if size is None:
+                pack = self.get_pack()
+                image = pack.get_image(path) if pack else None
+                if image is None:
+                    image = pg.image.load(path).convert_alpha()
+                    self.decoded += 1
+                else:
+                    self.packed += 1
+            else:
+                scale = pg.transform.smoothscale if smooth else pg.transform.scale
+                image = scale(self.get_image(path), size)
+            self.images[key] = image
+            self.bytes += self.get_size(image)
+        return image
+
+    def put_image(self, path, image):
+        """Hold an image decoded and converted elsewhere, as get_image would have loaded it"""
+        self.images[path, None, False] = image
+        self.decoded += 1
+        self.bytes += self.get_size(image)
+
+    def get_sequence(self, folder, size=None, smooth=False):
+        """Every image file in folder, in directory listing order, as a tuple"""
+        key = folder, size, smooth
+        sequence = self.sequences.get(key)
+        if sequence is None:
+            sequence = self.sequences[key] = tuple(
+                self.get_image(folder + '/' + file_name, size, smooth) for file_name in os.listdir(folder)
+                if os.path.isfile(os.path.join(folder, file_name)))
+        else:
+            self.requests += 1
+        return sequence
+
+    def get_sound(self, path):
+        sound = self.sounds.get(path)
+        if sound is None:
+            sound = self.sounds[path] = pg.mixer.Sound(path)
+        return sound
+
+    def put_sound(self, path, sound):
+        self.sounds[path] = sound
+
+    def get_pack(self):
+        if not self.pack_checked:
+            self.pack_checked = True
+            if os.path.exists(ASSET_PACK):
+                self.pack = AssetPack(ASSET_PACK)
+        return self.pack
+
+    def get_stats(self):
+        return {
+            'images': len(self.images),
+            'sequences': len(self.sequences),
+            'decoded': self.decoded,
+            'packed': self.packed,
+            'requests': self.requests,
+            'bytes': self.bytes,
+        }
+
+    @staticmethod
+    def get_size(surface):
+        # a packed image's rows are strided through its atlas page
+        if surface.get_parent() is not None:
+            return surface.get_width() * surface.get_bytesize() * surface.get_height()
+        return surface.get_pitch() * surface.get_height()
+
+
+class AssetLoader:
+    """
+    Loads images and sounds into a registry in the background. Files are decoded on a thread
+    pool, as pygame decodes without holding the GIL, while update does the display conversion
+    that needs the main thread, and maps packed images, a frame budget at a time.
+    """
+    def __init__(self, registry, image_paths, sound_paths, workers=ASSET_LOADER_WORKERS):
+        self.registry = registry
+        self.pool = ThreadPoolExecutor(workers)
+        self.pending = deque()  # (path, is_sound, decoding future or None for packed images) in order
+        pack = registry.get_pack()
+        for path in image_paths:
+            if (path, None, False) not in registry.images:
+                packed = pack is not None and pack.get_frame(path) is not None
+                self.pending.append((path, False, None if packed else self.pool.submit(pg.image.load, path)))
+        if pg.mixer.get_init():
+            for path in sound_paths:
+                if path not in registry.sounds:
+                    self.pending.append((path, True, self.pool.submit(pg.mixer.Sound, path)))
+        self.total = len(self.pending)
+        if not self.pending:
+            self.pool.shutdown()
+
+    @property
+    def progress(self):
+        return 1 - len(self.pending) / self.total if self.total else 1.0
+
+    def is_done(self):
+        return not self.pending
+
+    def update(self, budget=ASSET_LOADER_BUDGET):
+        """Store finished loads in order for up to budget milliseconds, waiting on the workers if they are behind"""
+        time_end = time.perf_counter() + budget / 1000
+        while self.pending:
+            path, is_sound, future = self.pending[0]
+            time_left = time_end - time.perf_counter()
+            if time_left <= 0 or future is not None and not wait([future], time_left).done:
+                return
+            self.pending.popleft()
+            if is_sound:
+                self.registry.put_sound(path, future.result())
+            elif future is None:
+                self.registry.get_image(path)
+            else:
+                self.registry.put_image(path, future.result().convert_alpha())
+        self.pool.shutdown()
+
+
+assets = AssetRegistry()
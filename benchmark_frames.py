@@ -0,0 +1,289 @@
+"""
+Times ray casting, sprite and minimap drawing, NPC logic and path queries separately while a
+camera walks the shipped map and generated maps, writing percentiles per subsystem as JSON, along
+with the chunk paging counters of map files.
+Run with: python benchmark_frames.py run --output results.json
+Compare two runs with: python benchmark_frames.py compare baseline.json results.json
+Record a camera path by playing with: python benchmark_frames.py record path.json
+"""
+import argparse
+import json
+import math
+import platform
+import random
+import statistics
+import sys
+import time
+from collections import deque
+
+import numpy as np
+import pygame as pg
+
+from main import Game
+from map import generate_map
+from npc import SoldierNPC
+from settings import *
+
+# (object path from the game, method) timed in each frame
+SUBSYSTEMS = [
+    ('raycasting', 'ray_cast'),
+    ('raycasting', 'get_objects_to_render'),
+    ('object_renderer', 'render_game_objects'),
+    ('object_renderer', 'draw_minimap'),
+    ('object_handler', 'update'),
+    ('object_handler', 'project_sprites'),
+    ('pathfinding', 'get_path'),
+    ('pathfinding', 'get_paths'),
+    ('pathfinding', 'update'),
+]
+PERCENTILES = 50, 90, 95, 99
+
+
+def time_subsystems(game, frame_times):
+    """Wrap the subsystem methods on the game's objects to add their time to frame_times"""
+    def timed(name, method):
+        def wrapper(*args, **kwargs):
+            time_start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                frame_times[name] += (time.perf_counter() - time_start) * 1000
+        return wrapper
+
+    for owner, method in SUBSYSTEMS:
+        obj = getattr(game, owner)
+        setattr(obj, method, timed(f'{type(obj).__name__}.{method}', getattr(obj, method)))
+
+
+def make_game(level, npc_density, rng):
+    """Headless game on the shipped map, or on the given level or map file with soldiers on a share of its floor"""
+    game = Game(headless=True, level=level)
+    if level is None:
+        return game
+
+    object_handler = game.object_handler
+    object_handler.clear()
+    floor = get_floor(game.map)
+    for x, y in rng.sample(floor, int(len(floor) * npc_density)):
+        object_handler.add_npc(SoldierNPC(game, pos=(x + rng.uniform(0.2, 0.8), y + rng.uniform(0.2, 0.8))))
+    object_handler.update_npc_grid()
+    return game
+
+
+def get_floor(game_map):
+    return [(x, y) for y in range(game_map.rows) for x in range(game_map.cols) if not game_map.is_wall(x, y)]
+
+
+def get_route(pathfinding, start, goal):
+    """Tiles from start to goal over the floor tiles, empty if it cannot be reached"""
+    came_from = {start: None}
+    queue = deque([start])
+    while queue:
+        tile = queue.popleft()
+        if tile == goal:
+            break
+        for next_tile in pathfinding.get_next_nodes(*tile):
+            if next_tile not in came_from:
+                came_from[next_tile] = tile
+                queue.append(next_tile)
+    if goal not in came_from:
+        return []
+    route = []
+    while goal is not None:
+        route.append(goal)
+        goal = came_from[goal]
+    return route[::-1]
+
+
+def make_tour(game, frames, rng):
+    """Camera poses walking at player speed between random floor tiles, looking ahead with a slow sweep"""
+    floor = get_floor(game.map)
+    step = PLAYER_SPEED * SIM_STEP
+    x, y = game.player.pos
+    angle = game.player.angle
+    poses = []
+    while len(poses) < frames:
+        route = get_route(game.pathfinding, (int(x), int(y)), rng.choice(floor))
+        for tile_x, tile_y in route[1:]:
+            target_x, target_y = tile_x + 0.5, tile_y + 0.5
+            distance = math.hypot(target_x - x, target_y - y)
+            heading = math.atan2(target_y - y, target_x - x)
+            for _ in range(max(1, round(distance / step))):
+                # turn towards the heading a little each frame, as a player would
+                turn = (heading - angle + math.pi) % math.tau - math.pi
+                angle += max(-0.08, min(0.08, turn))
+                x += math.cos(heading) * min(step, distance)
+                y += math.sin(heading) * min(step, distance)
+                poses.append((x, y, angle + 0.4 * math.sin(len(poses) * 0.03)))
+            x, y = target_x, target_y
+    return poses[:frames]
+
+
+def summarize(samples):
+    percentiles = statistics.quantiles(samples, n=100, method='inclusive')
+    summary = {'mean': statistics.fmean(samples), 'max': max(samples)}
+    summary.update({f'p{p}': percentiles[p - 1] for p in PERCENTILES})
+    return summary
+
+
+def run_scenario(game, poses, warmup):
+    """Step and draw the game once per pose, returning per-frame milliseconds by subsystem"""
+    frame_times = dict.fromkeys([f'{type(getattr(game, owner)).__name__}.{method}' for owner, method in SUBSYSTEMS], 0.0)
+    time_subsystems(game, frame_times)
+    samples = {name: [] for name in ['frame', 'Game.update', 'Game.draw', *frame_times]}
+    player = game.player
+
+    for frame, (x, y, angle) in enumerate(poses):
+        # healed every frame, so NPC attacks never end the run
+        player.x, player.y, player.angle, player.health = x, y, angle, PLAYER_MAX_HEALTH
+        for name in frame_times:
+            frame_times[name] = 0.0
+        time_start = time.perf_counter()
+        game.update()
+        time_update = time.perf_counter()
+        game.draw()
+        time_end = time.perf_counter()
+        if frame < warmup:
+            continue
+        samples['frame'].append((time_end - time_start) * 1000)
+        samples['Game.update'].append((time_update - time_start) * 1000)
+        samples['Game.draw'].append((time_end - time_update) * 1000)
+        for name, value in frame_times.items():
+            samples[name].append(value)
+    return {name: summarize(values) for name, values in samples.items() if values}
+
+
+def print_results(name, results):
+    print(f'\n{name}')
+    print(f'{"subsystem":>36} {"mean":>8} ' + ' '.join(f'{f"p{p}":>8}' for p in PERCENTILES) + f' {"max":>8}')
+    for subsystem, summary in results.items():
+        print(f'{subsystem:>36} {summary["mean"]:>8.3f} '
+              + ' '.join(f'{summary[f"p{p}"]:>8.3f}' for p in PERCENTILES) + f' {summary["max"]:>8.3f}')
+
+
+def print_map_stats(stats):
+    print(f'{"map chunks":>36} ' + ' '.join(f'{key:>12}' for key in stats))
+    print(f'{"":>36} ' + ' '.join(f'{value:>12}' for value in stats.values()))
+
+
+def run(args):
+    scenarios = {}
+    map_stats = {}  # chunk paging counters of the map file scenarios
+    for name, level in [('shipped', None)] + [(f'{size}x{size}', size) for size in args.sizes]:
+        rng = random.Random(args.seed)
+        if level is not None:
+            level = generate_map(level, level, args.density, seed=args.seed)
+        game = make_game(level, args.npc_density, rng)
+        scenarios[name] = run_scenario(game, make_tour(game, args.frames + args.warmup, rng), args.warmup)
+        print_results(name, scenarios[name])
+
+    for path in args.maps:
+        rng = random.Random(args.seed)
+        game = make_game(path, args.npc_density, rng)
+        name = f'map:{path}'
+        scenarios[name] = run_scenario(game, make_tour(game, args.frames + args.warmup, rng), args.warmup)
+        print_results(name, scenarios[name])
+        map_stats[name] = game.map.get_stats()
+        print_map_stats(map_stats[name])
+
+    for path in args.paths:
+        with open(path) as file:
+            poses = json.load(file)['poses']
+        game = make_game(None, args.npc_density, random.Random(args.seed))
+        name = f'recorded:{path}'
+        scenarios[name] = run_scenario(game, poses, args.warmup)
+        print_results(name, scenarios[name])
+
+    if args.output:
+        meta = {
+            'frames': args.frames, 'warmup': args.warmup, 'seed': args.seed, 'sizes': args.sizes, 'maps': args.maps,
+            'python': platform.python_version(), 'numpy': np.__version__, 'pygame': pg.version.ver,
+            'machine': platform.machine(), 'wall_renderer': WALL_RENDERER, 'pathfinding_mode': PATHFINDING_MODE,
+        }
+        with open(args.output, 'w') as file:
+            json.dump({'meta': meta, 'scenarios': scenarios, 'map_stats': map_stats}, file, indent=2)
+
+
+def record(args):
+    """Play the shipped map normally, saving the camera pose of every simulation step when the game quits"""
+    game = Game()
+    poses = []
+    update = game.update
+
+    def update_and_record():
+        update()
+        poses.append((game.player.x, game.player.y, game.player.angle))
+    game.update = update_and_record
+    try:
+        game.run()
+    except SystemExit:
+        pass
+    finally:
+        with open(args.output, 'w') as file:
+            json.dump({'map': 'shipped', 'poses': poses}, file)
+        print(f'recorded {len(poses)} poses to {args.output}')
+
+
+def compare(args):
+    """Print current against baseline, returning 1 if any statistic got slower than the threshold allows"""
+    with open(args.baseline) as file:
+        baseline = json.load(file)['scenarios']
+    with open(args.current) as file:
+        current = json.load(file)['scenarios']
+
+    regressions = 0
+    print(f'{"scenario":>16} {"subsystem":>36} {"stat":>5} {"baseline":>9} {"current":>9} {"change":>8}')
+    for scenario, results in current.items():
+        for subsystem, summary in results.items():
+            base = baseline.get(scenario, {}).get(subsystem)
+            if base is None:
+                continue
+            for stat in args.stats:
+                before, after = base[stat], summary[stat]
+                change = (after - before) / before if before else 0.0
+                # tiny timings are all noise, so they need to grow by min_ms as well
+                regressed = change > args.threshold and after - before > args.min_ms
+                regressions += regressed
+                print(f'{scenario:>16} {subsystem:>36} {stat:>5} {before:>9.3f} {after:>9.3f} {change:>+8.1%}'
+                      + ('  REGRESSION' if regressed else ''))
+    print(f'\n{regressions} regression(s) over {args.threshold:.0%}')
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='time each subsystem along the camera paths')
+    run_parser.add_argument('--frames', type=int, default=300, help='timed frames per camera path')
+    run_parser.add_argument('--warmup', type=int, default=30, help='frames run before timing, to fill caches')
+    run_parser.add_argument('--sizes', type=int, nargs='*', default=[64, 128], help='generated map sizes')
+    run_parser.add_argument('--density', type=float, default=0.2, help='wall density of generated maps')
+    run_parser.add_argument('--maps', nargs='*', default=[], help='map files from make_map.py to walk as well')
+    run_parser.add_argument('--npc-density', type=float, default=0.05, help='soldiers per floor tile on generated maps')
+    run_parser.add_argument('--paths', nargs='*', default=[], help='recorded camera paths to replay on the shipped map')
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--output', help='JSON file for the results')
+
+    record_parser = commands.add_parser('record', help='play the shipped map and save the camera path')
+    record_parser.add_argument('output', help='JSON file for the camera path')
+
+    compare_parser = commands.add_parser('compare', help='flag regressions against a saved baseline')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.25,
+                                help='allowed slowdown as a fraction, runs on one machine vary by 10-15%%')
+    compare_parser.add_argument('--min-ms', type=float, default=0.05, help='slowdowns smaller than this are ignored')
+    compare_parser.add_argument('--stats', nargs='*', default=['p50', 'p95'], help='statistics compared')
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        run(args)
+    elif args.command == 'record':
+        record(args)
+    else:
+        sys.exit(compare(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Measures memory per NPC and NPC update throughput with thousands of soldiers chasing the
+player across a generated map. Run with: python benchmark_npcs.py
+"""
+import argparse
+import random
+import statistics
+import time
+import tracemalloc
+
+from main import Game
+from map import generate_map
+from npc import SoldierNPC
+from settings import SIM_STEP
+
+
+def benchmark(count, size, frames, rng):
+    game = Game(headless=True, level=generate_map(size, size, seed=rng.randrange(1 << 30)))
+    floor = [(x, y) for y in range(game.map.rows) for x in range(game.map.cols) if not game.map.is_wall(x, y)]
+    game.player.x, game.player.y = floor[len(floor) // 2][0] + 0.5, floor[len(floor) // 2][1] + 0.5
+    game.player.health = float('inf')
+    object_handler = game.object_handler
+    object_handler.clear()
+
+    # one soldier loads the shared frames, so the rest only add their own row
+    object_handler.add_npc(SoldierNPC(game, pos=(floor[0][0] + 0.5, floor[0][1] + 0.5)))
+    tracemalloc.start()
+    memory_start = tracemalloc.get_traced_memory()[0]
+    time_start = time.perf_counter()
+    for x, y in rng.sample(floor, count):
+        object_handler.add_npc(SoldierNPC(game, pos=(x + rng.uniform(0.2, 0.8), y + rng.uniform(0.2, 0.8))))
+    create_time = time.perf_counter() - time_start
+    python_bytes = tracemalloc.get_traced_memory()[0] - memory_start
+    tracemalloc.stop()
+    npc_store = object_handler.npc_store
+    array_bytes, frame_bytes = npc_store.get_memory()
+
+    for npc in object_handler.npc_list:
+        npc.player_search_trigger = True
+    game.raycasting.update()
+    update_times, logic_times, thoughts, lags = [], [], [], []
+
+    # the store's share of each update, timed inside ObjectHandler.update
+    npc_update = npc_store.update
+
+    def timed_npc_update():
+        time_start = time.perf_counter()
+        npc_update()
+        logic_times.append((time.perf_counter() - time_start) * 1000)
+    npc_store.update = timed_npc_update
+
+    for _ in range(frames):
+        game.time += SIM_STEP
+        time_start = time.perf_counter()
+        game.pathfinding.update()
+        object_handler.project_sprites()
+        object_handler.update()
+        update_times.append((time.perf_counter() - time_start) * 1000)
+        thoughts.append(npc_store.thought)
+        # updates since the NPC that has waited longest last thought
+        lags.append(npc_store.frame_number - npc_store.last_think[:npc_store.count][npc_store.alive[:npc_store.count]].min())
+
+    print(f'{count:>8} {size:>5}x{size:<5} {python_bytes / count:>10.0f} {array_bytes / npc_store.capacity:>10.0f}'
+          f' {frame_bytes / 2 ** 20:>10.1f} {create_time / count * 1000:>10.3f}'
+          f' {statistics.median(update_times):>10.2f} {statistics.median(logic_times):>10.2f}'
+          f' {statistics.mean(thoughts):>8.0f} {max(lags):>8}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--counts', type=int, nargs='*', default=[1000, 10000], help='NPCs per run')
+    parser.add_argument('--frames', type=int, default=40, help='updates timed per run')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f'{"npcs":>8} {"map":>11} {"py B/npc":>10} {"arr B/npc":>10} {"frames MB":>10} {"create ms":>10}'
+          f' {"update ms":>10} {"logic ms":>10} {"thinks":>8} {"max lag":>8}')
+    for count in args.counts:
+        # about one NPC per five floor tiles
+        benchmark(count, max(64, int((count * 6.5) ** 0.5)), args.frames, rng)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Compares BFS, A* and hierarchical path queries on the shipped map and on generated maps.
+Reports nodes expanded and wall time per query. Run with: python benchmark_pathfinding.py
+"""
+import argparse
+import random
+import statistics
+import time
+from types import SimpleNamespace
+
+from map import Map, mini_map, generate_map
+from pathfinding import PathFinding
+
+
+class BenchmarkGame:
+    """Just enough of Game for Map and PathFinding, without a display"""
+    def __init__(self, level):
+        self.object_handler = SimpleNamespace(npc_positions=set())
+        self.map = Map(self, level)
+        self.pathfinding = PathFinding(self)
+
+
+def run_queries(pathfinding, find_path, pairs):
+    times, expanded = [], []
+    for start, goal in pairs:
+        time_start = time.perf_counter()
+        find_path(start, goal)
+        times.append((time.perf_counter() - time_start) * 1000)
+        expanded.append(pathfinding.expanded)
+    return times, expanded
+
+
+def benchmark(name, level, queries, rng):
+    game = BenchmarkGame(level)
+    pathfinding = game.pathfinding
+    floor = [(x, y) for y in range(game.map.rows) for x in range(game.map.cols) if not game.map.is_wall(x, y)]
+    pairs = [tuple(rng.sample(floor, 2)) for _ in range(queries)]
+
+    time_start = time.perf_counter()
+    pathfinding.build_hierarchy()
+    print(f'{name:>12} clusters built in {(time.perf_counter() - time_start) * 1000:.1f} ms')
+
+    for mode, find_path in (('bfs', pathfinding.get_bfs_path), ('astar', pathfinding.get_astar_path),
+                            ('hierarchical', pathfinding.get_hierarchical_path)):
+        times, expanded = run_queries(pathfinding, find_path, pairs)
+        print(f'{name:>12} {mode:>12} {statistics.mean(expanded):>12.0f} {statistics.median(times):>10.3f}'
+              f' {statistics.mean(times):>10.3f} {max(times):>10.3f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--queries', type=int, default=50, help='random start/goal pairs per map')
+    parser.add_argument('--sizes', type=int, nargs='*', default=[64, 128, 256], help='generated map sizes')
+    parser.add_argument('--density', type=float, default=0.2, help='wall density of generated maps')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f'{"map":>12} {"mode":>12} {"expanded":>12} {"median ms":>10} {"mean ms":>10} {"max ms":>10}')
+    benchmark('shipped', mini_map, args.queries, rng)
+    for size in args.sizes:
+        level = generate_map(size, size, args.density, seed=args.seed)
+        benchmark(f'{size}x{size}', level, args.queries, rng)
+
+
+if __name__ == '__main__':
+    main()
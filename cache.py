@@ -0,0 +1,67 @@
+from collections import OrderedDict
+
+
+class SurfaceCache:
+    """
+    Least-recently-used cache of pygame Surfaces bounded by the memory their pixels use.
+    Keeps hit/miss counters so the quantization feeding its keys can be tuned.
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.surfaces = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return the cached surface for key, or None on a miss"""
+        surface = self.surfaces.get(key)
+        if surface is None:
+            self.misses += 1
+            return None
+        self.surfaces.move_to_end(key)
+        self.hits += 1
+        return surface
+
+    def put(self, key, surface):
+        """Store a surface, evicting the least recently used ones to stay within budget"""
+        size = self.get_size(surface)
+        if size > self.max_bytes:
+            return surface
+        if key in self.surfaces:
+            self.bytes -= self.get_size(self.surfaces.pop(key))
+        self.surfaces[key] = surface
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            _, evicted = self.surfaces.popitem(last=False)
+            self.bytes -= self.get_size(evicted)
+            self.evictions += 1
+        return surface
+
+    def clear(self):
+        self.surfaces.clear()
+        self.bytes = 0
+
+    def reset_stats(self):
+        self.hits = self.misses = self.evictions = 0
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get_stats(self):
+        return {
+            'entries': len(self.surfaces),
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hit_rate,
+        }
+
+    @staticmethod
+    def get_size(surface):
+        return surface.get_pitch() * surface.get_height()
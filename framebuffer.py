@@ -0,0 +1,92 @@
+import pygame as pg
+import numpy as np
+from settings import *
+
+
+class FrameBuffer:
+    """
+    Wall renderer that rasterizes every wall column into one frame-sized surface. Textures are
+    kept as pixel arrays in the frame's pixel format, and the frame is filled a block of rays at
+    a time with vectorized texel gathers straight into its pixels, then drawn with one blit
+    instead of a scale and blit per column.
+    """
+    def __init__(self, game, textures):
+        self.game = game
+        self.frame = pg.Surface((NUM_RAYS * SCALE, HEIGHT)).convert()
+        self.color_key = self.frame.map_rgb(WALL_COLOR_KEY)
+        self.frame.set_colorkey(WALL_COLOR_KEY)
+        self.texels = self.get_texels(textures)
+
+        # rays filled together, over the rows the tallest of their walls covers
+        self.block_rays = max(1, WALL_BLOCK_WIDTH // SCALE)
+        self.block_starts = list(range(0, NUM_RAYS, self.block_rays))
+        self.rows = np.arange(HEIGHT, dtype=np.float32)[:, None]
+
+        # per-block work buffers, reused to avoid allocating arrays every draw
+        self.texture_y = np.empty(HEIGHT * self.block_rays, dtype=np.float32)
+        self.texel_index = np.empty(HEIGHT * self.block_rays, dtype=np.int32)
+        self.block_pixels = np.empty(HEIGHT * self.block_rays, dtype=np.uint32)
+
+    def get_texels(self, textures):
+        """
+        Stack the wall textures into one flat array indexed by (id, y + 1, x), so neighbouring
+        screen columns read neighbouring texels. Every texture is padded with a row of the
+        color key above and below, so rows outside a wall resolve to transparent pixels
+        without a separate mask.
+        """
+        texels = np.full((max(textures) + 1, TEXTURE_SIZE + 2, TEXTURE_SIZE), self.color_key, dtype=np.uint32)
+        for texture_id, texture in textures.items():
+            texels[texture_id, 1:-1] = pg.surfarray.array2d(texture.convert(self.frame)).T
+        return texels.ravel()
+
+    def render(self, proj_height, texture, offset):
+        """Fill the frame with the wall columns described by the ray casting arrays"""
+        height = proj_height.astype(np.float32)
+        texture_start = HALF_HEIGHT - height / 2
+        texture_step = TEXTURE_SIZE / height
+        base = (texture.astype(np.int32) * ((TEXTURE_SIZE + 2) * TEXTURE_SIZE) +
+                (offset * (TEXTURE_SIZE - SCALE)).astype(np.int32))
+
+        # rows above and below the tallest wall of a block are only color key
+        tops = (HALF_HEIGHT - np.maximum.reduceat(height, self.block_starts) / 2).clip(0, HALF_HEIGHT)
+        tops = tops.astype(np.int32).tolist()
+        for start, top in zip(self.block_starts, tops):
+            self.frame.fill(WALL_COLOR_KEY, (start * SCALE, 0, self.block_rays * SCALE, top))
+            self.frame.fill(WALL_COLOR_KEY, (start * SCALE, HEIGHT - top, self.block_rays * SCALE, top))
+
+        pixels = pg.surfarray.pixels2d(self.frame).T  # row-major, as the surface is laid out
+        for start, top in zip(self.block_starts, tops):
+            self.render_block(pixels, start, top, texture_start, texture_step, base)
+        # the surface stays locked while its pixels are referenced
+        del pixels
+
+    def render_block(self, pixels, start, top, texture_start, texture_step, base):
+        """Gather the texels of a block of rays into the frame's pixels, between rows top and HEIGHT - top"""
+        end = min(start + self.block_rays, NUM_RAYS)
+        rays = slice(start, end)
+        shape = HEIGHT - 2 * top, end - start
+        size = shape[0] * shape[1]
+        if not size:
+            return
+
+        # texture rows per ray, shared by the SCALE screen columns of that ray
+        texture_y = self.texture_y[:size].reshape(shape)
+        np.subtract(self.rows[top:HEIGHT - top], texture_start[rays], out=texture_y)
+        np.multiply(texture_y, texture_step[rays], out=texture_y)
+        np.add(texture_y, 1, out=texture_y)
+        np.clip(texture_y, 0, TEXTURE_SIZE + 1, out=texture_y)
+        texel_index = self.texel_index[:size].reshape(shape)
+        texel_index[...] = texture_y
+        texel_index *= TEXTURE_SIZE
+        texel_index += base[rays]
+
+        block = pixels[top:HEIGHT - top, start * SCALE:end * SCALE].reshape(shape[0], shape[1], SCALE)
+        block_pixels = self.block_pixels[:size].reshape(shape)
+        for shift in range(SCALE):
+            if shift:
+                texel_index += 1
+            self.texels.take(texel_index, out=block_pixels)
+            block[:, :, shift] = block_pixels
+
+    def draw(self):
+        self.game.screen.blit(self.frame, (0, 0))
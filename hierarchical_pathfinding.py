@@ -0,0 +1,152 @@
+from heapq import heappush, heappop
+from settings import *
+
+
+class HierarchicalPathFinding:
+    """
+    Cluster abstraction over PathFinding's grid of floor tiles for large maps. The map is split into
+    PATHFINDING_CLUSTER_SIZE square clusters joined by entrance tiles on their borders;
+    costs between the entrances of each cluster are precomputed. A query searches the
+    small entrance graph and only refines the first leg, inside the start cluster. The
+    entrance graph is built a border or entrance at a time by the build generator.
+    """
+    def __init__(self, pathfinding):
+        self.pathfinding = pathfinding
+        self.rows, self.cols = pathfinding.rows, pathfinding.cols
+        self.cluster_size = PATHFINDING_CLUSTER_SIZE
+        self.entrances = {}  # cluster -> entrance tiles inside it
+        self.edges = {}  # entrance tile -> [(entrance tile, cost)]
+        self.expanded = 0
+
+    def get_cluster(self, node):
+        return node[0] // self.cluster_size, node[1] // self.cluster_size
+
+    def build(self):
+        """Find the entrances on every cluster border and the costs between them, pausing after each"""
+        size = self.cluster_size
+        for x in range(size - 1, self.cols - 1, size):
+            self.add_border([((x, y), (x + 1, y)) for y in range(self.rows)])
+            yield
+        for y in range(size - 1, self.rows - 1, size):
+            self.add_border([((x, y), (x, y + 1)) for x in range(self.cols)])
+            yield
+
+        for cluster, entrances in self.entrances.items():
+            for entrance in entrances:
+                cost, _ = self.search_cluster(entrance)
+                self.edges[entrance] += [(other, cost[other]) for other in entrances
+                                         if other != entrance and other in cost]
+                yield
+
+    def add_border(self, pairs):
+        """One entrance in the middle of each open stretch of a border, split at cluster corners"""
+        segment = []
+        for pair in pairs + [None]:
+            crossing = pair and self.pathfinding.is_floor(pair[0]) and self.pathfinding.is_floor(pair[1])
+            if crossing and (not segment or self.get_cluster(pair[0]) == self.get_cluster(segment[0][0])):
+                segment.append(pair)
+                continue
+            if segment:
+                inside, outside = segment[len(segment) // 2]
+                for entrance in (inside, outside):
+                    self.entrances.setdefault(self.get_cluster(entrance), set()).add(entrance)
+                    self.edges.setdefault(entrance, [])
+                self.edges[inside].append((outside, 1.0))
+                self.edges[outside].append((inside, 1.0))
+            segment = [pair] if crossing else []
+
+    def search_cluster(self, start, blocked=()):
+        """Dijkstra from start over the tiles of its own cluster, returns costs and parents"""
+        size = self.cluster_size
+        # the cluster's walls with a ring of walls around it, so steps need no bounds checks
+        min_x, min_y = start[0] // size * size - 1, start[1] // size * size - 1
+        cols = size + 2
+        walls = self.pathfinding.get_walls(min_x, min_y, min_x + cols, min_y + cols)
+        for x, y in blocked:
+            if min_x < x < min_x + cols - 1 and min_y < y < min_y + cols - 1:
+                walls[(y - min_y) * cols + x - min_x] = True
+        steps = [(dy * cols + dx, SQRT_2 if dx and dy else 1.0) for dx, dy in self.pathfinding.ways]
+
+        start_id = (start[1] - min_y) * cols + start[0] - min_x
+        cost = {start_id: 0.0}
+        parent = {start_id: None}
+        heap = [(0.0, start_id)]
+        while heap:
+            cur_cost, cur_id = heappop(heap)
+            if cur_cost > cost[cur_id]:
+                continue
+            self.expanded += 1
+            for offset, step_cost in steps:
+                next_id = cur_id + offset
+                if walls[next_id]:
+                    continue
+                next_cost = cur_cost + step_cost
+                if next_cost < cost.get(next_id, float('inf')):
+                    cost[next_id] = next_cost
+                    parent[next_id] = cur_id
+                    heappush(heap, (next_cost, next_id))
+
+        nodes = {tile_id: (min_x + tile_id % cols, min_y + tile_id // cols) for tile_id in cost}
+        nodes[None] = None
+        return ({nodes[tile_id]: tile_cost for tile_id, tile_cost in cost.items()},
+                {nodes[tile_id]: nodes[parent_id] for tile_id, parent_id in parent.items()})
+
+    def get_path(self, start, goal, blocked):
+        """
+        Next tile from start towards goal, or None when the abstract graph has no route or
+        NPCs cut the start tile off from the first waypoint, so the first leg cannot be refined
+        """
+        self.expanded = 0
+        start_cost, start_parent = self.search_cluster(start, blocked)
+        goal_cost, _ = self.search_cluster(goal)
+        start_entrances = [(entrance, start_cost[entrance])
+                           for entrance in self.entrances.get(self.get_cluster(start), ()) if entrance in start_cost]
+        goal_entrances = {entrance: goal_cost[entrance]
+                          for entrance in self.entrances.get(self.get_cluster(goal), ()) if entrance in goal_cost}
+
+        # A* over the entrances, from a virtual start node linked to its cluster's entrances
+        goal_x, goal_y = goal
+        cost = {}
+        parent = {}
+        heap = []
+        for entrance, entrance_cost in start_entrances:
+            cost[entrance] = entrance_cost
+            parent[entrance] = None
+            heappush(heap, (entrance_cost + self.pathfinding.octile(entrance[0] - goal_x, entrance[1] - goal_y),
+                            entrance))
+        closed = set()
+        path_end = None
+        while heap:
+            cur_node = heappop(heap)[1]
+            if cur_node == goal:
+                path_end = parent[goal]
+                break
+            if cur_node in closed:
+                continue
+            closed.add(cur_node)
+            self.expanded += 1
+            next_nodes = self.edges[cur_node]
+            if cur_node in goal_entrances:
+                next_nodes = next_nodes + [(goal, goal_entrances[cur_node])]
+            for next_node, edge_cost in next_nodes:
+                next_cost = cost[cur_node] + edge_cost
+                if next_cost < cost.get(next_node, float('inf')):
+                    cost[next_node] = next_cost
+                    parent[next_node] = cur_node
+                    heappush(heap, (next_cost + self.pathfinding.octile(next_node[0] - goal_x, next_node[1] - goal_y),
+                                    next_node))
+        if path_end is None:
+            return None
+
+        # first waypoint that is not the start tile, then refine only the leg towards it
+        waypoints = [path_end]
+        while parent[waypoints[-1]] is not None:
+            waypoints.append(parent[waypoints[-1]])
+        waypoints = [waypoint for waypoint in reversed(waypoints) if waypoint != start] + [goal]
+        waypoint = waypoints[0]
+        if waypoint not in start_parent:
+            # an entrance across the border from the start tile, or one NPCs cut off from it
+            return waypoint if waypoint in self.pathfinding.get_next_nodes(*start) else None
+        while start_parent[waypoint] != start:
+            waypoint = start_parent[waypoint]
+        return waypoint
@@ -0,0 +1,56 @@
+class HudLayer:
+    """
+    A cached piece of the HUD. The render callback only runs when the inputs passed to
+    the compositor change; otherwise the previous surface is reused.
+    """
+    def __init__(self, render, static=False):
+        self.render = render
+        self.static = static  # static layers stay on screen and are only blitted when they change
+        self.inputs = None
+        self.surface = None
+        self.pos = None
+        self.rect = None
+        self.dirty = True
+
+
+class Hud:
+    """
+    Retained-mode compositor for HUD layers. Tracks the screen areas that static layers
+    changed so screens that are otherwise static can be presented with pg.display.update(rects).
+    """
+    def __init__(self, screen):
+        self.screen = screen
+        self.layers = {}
+        self.dirty_rects = []
+
+    def add_layer(self, name, render, static=False):
+        self.layers[name] = HudLayer(render, static)
+
+    def draw(self, name, pos, *inputs):
+        """Blit a layer at pos, re-rendering it first if its inputs changed"""
+        layer = self.layers[name]
+        if layer.surface is None or inputs != layer.inputs:
+            layer.inputs = inputs
+            layer.surface = layer.render(*inputs)
+            layer.dirty = True
+        if pos != layer.pos:
+            layer.pos = pos
+            layer.dirty = True
+        if layer.static and not layer.dirty:
+            return layer.rect
+
+        rect = self.screen.blit(layer.surface, pos)
+        if layer.static and layer.dirty:
+            self.dirty_rects.append(rect.union(layer.rect) if layer.rect else rect)
+        layer.dirty = False
+        layer.rect = rect
+        return rect
+
+    def invalidate(self):
+        """Force every layer to be blitted again, e.g. after something else drew over the screen"""
+        for layer in self.layers.values():
+            layer.dirty = True
+
+    def get_dirty_rects(self):
+        dirty_rects, self.dirty_rects = self.dirty_rects, []
+        return dirty_rects
@@ -1,5 +1,8 @@
 import pygame as pg
+import argparse
+import os
 import sys
+import time
 from settings import *
 from map import *
 from player import *
@@ -10,6 +13,8 @@ from object_handler import *
 from weapon import *
 from sound import *
 from pathfinding import *
+from profiler import FrameProfiler
+from assets import AssetLoader, assets, find_files
 
 
 class Game:
@@ -17,72 +22,163 @@ class Game:
     Main game class that handles initialization, game loop, and core game mechanics.
     This is a demon-hunting FPS game where the player must eliminate all demons to win.
     """
-    def __init__(self):
-        # Initialize Pygame and setup display
+    def __init__(self, headless=False, level=None):
+        # Initialize Pygame and setup display, on dummy devices when headless
+        self.headless = headless
+        if headless:
+            os.environ['SDL_VIDEODRIVER'] = 'dummy'
+            os.environ['SDL_AUDIODRIVER'] = 'dummy'
         pg.init()
         pg.mouse.set_visible(False)  # Hide mouse cursor for immersion
         self.screen = pg.display.set_mode(RES)
+        pg.display.set_caption('Demon Hunter')
+        self.profiler = FrameProfiler()  # per stage frame times, outlives restarts
         self.clock = pg.time.Clock()
-        self.delta_time = 1
+        self.delta_time = SIM_STEP  # game logic always advances by one fixed step
+        self.accumulator = 0  # elapsed milliseconds not simulated yet
+        self.alpha = 1  # how far drawing is from the previous step to the latest
+        self.time = 0  # milliseconds of game time, which game logic times itself by
         
         # Setup game events and state
         self.global_trigger = False
-        self.global_event = pg.USEREVENT + 0
-        pg.time.set_timer(self.global_event, 40)  # 40ms timer for game events
         self.is_victory = False
+        self.map = None  # the world is built by the first new_game and reset by later ones
         
-        # Start a new game
-        self.new_game()
-
-    def new_game(self):
-        """Initialize all game components for a new game session"""
-        self.map = Map(self)  # Game map
-        self.player = Player(self)  # Player character
-        self.object_renderer = ObjectRenderer(self)  # Handles game rendering
-        self.raycasting = RayCasting(self)  # 3D rendering engine
-        self.object_handler = ObjectHandler(self)  # Manages game objects and NPCs
-        self.weapon = Weapon(self)  # Player's weapon
-        self.sound = Sound(self)  # Game audio
-        self.pathfinding = PathFinding(self)  # Enemy AI pathfinding
+        # Load assets behind a loading screen, then start a new game from them
+        self.load_assets()
+        self.new_game(level)
+
+    def load_assets(self):
+        """Decode every image and sound effect on worker threads, drawing progress until they are all in the registry"""
+        loader = AssetLoader(assets, find_files(ASSET_PACK_ROOTS, '.png'), find_files((SOUND_PATH,), '.wav'))
+        font = pg.font.Font(None, 60)
+        while not loader.is_done():
+            loader.update()
+            self.show_loading(font, loader.progress)
+
+    def show_loading(self, font, progress):
+        for event in pg.event.get():
+            if event.type == pg.QUIT or (event.type == pg.KEYDOWN and event.key == pg.K_ESCAPE):
+                pg.quit()
+                sys.exit()
+        if not self.headless:
+            self.draw_loading(font, progress)
+            pg.display.flip()
+
+    def draw_loading(self, font, progress):
+        self.screen.fill('black')
+        text = font.render('Loading', True, 'white')
+        self.screen.blit(text, text.get_rect(midbottom=(HALF_WIDTH, HALF_HEIGHT - 20)))
+        bar = pg.Rect(0, 0, WIDTH // 3, 24)
+        bar.midtop = HALF_WIDTH, HALF_HEIGHT
+        pg.draw.rect(self.screen, 'white', bar, 2)
+        filled = bar.inflate(-8, -8)
+        filled.width = round(filled.width * progress)
+        self.screen.fill('white', filled)
+
+    def new_game(self, level=None):
+        """
+        Start a game session. The first call, and any call given a level as rows of wall ids or a
+        map file path, builds every game component on that level, the shipped map by default.
+        Other calls reset the session state in place: the map, textures, sounds, caches and path
+        search buffers are kept.
+        """
+        if self.map is None or level is not None:
+            self.map = Map(self, mini_map if level is None else level)  # Game map
+            self.player = Player(self)  # Player character
+            self.object_renderer = ObjectRenderer(self)  # Handles game rendering
+            self.raycasting = RayCasting(self)  # 3D rendering engine
+            self.object_handler = ObjectHandler(self)  # Manages game objects and NPCs
+            self.weapon = Weapon(self)  # Player's weapon
+            self.sound = Sound(self)  # Game audio
+            self.pathfinding = PathFinding(self)  # Enemy AI pathfinding
+        else:
+            self.player = Player(self)
+            self.object_renderer.reset()
+            self.object_handler.reset()
+            self.weapon = Weapon(self)
+            self.pathfinding.reset()
         
         # Reset game state
         self.is_victory = False
-        self.object_renderer.explored_areas.clear()
+        self.accumulator = 0
 
     def update(self):
-        """Update game state for each frame"""
+        """Advance the game by one fixed simulation step"""
+        profiler = self.profiler
+        self.time += SIM_STEP
+        # global game events fire every GLOBAL_EVENT_TIME of game time
+        self.global_trigger = self.time // GLOBAL_EVENT_TIME != (self.time - SIM_STEP) // GLOBAL_EVENT_TIME
+        self.map.update()
+        self.player.save_state()
+        self.object_handler.npc_store.save_state()
         self.player.update()
-        self.raycasting.update()
+        profiler.lap('player')
+        self.pathfinding.update()
+        profiler.lap('pathfinding')
         self.object_handler.update()
+        profiler.lap('npcs')
         self.weapon.update()
+        self.object_renderer.update()
         self.check_victory()
-        
-        # Update display
+        profiler.lap('weapon')
+
+    def simulate(self):
+        """Run as many simulation steps as the elapsed time calls for, leaving the remainder for the next frame"""
+        while self.accumulator >= SIM_STEP and self.player.is_alive and not self.is_victory:
+            # taken first, since a step that ends the game starts a new one with an empty backlog
+            self.accumulator -= SIM_STEP
+            self.update()
+        self.alpha = min(self.accumulator / SIM_STEP, 1)
+
+    def update_frame(self):
+        """Present the drawn frame and add its time to the simulation backlog, dropping what is too far behind"""
         pg.display.flip()
-        self.delta_time = self.clock.tick(FPS)
-        pg.display.set_caption(f'Demon Hunter - FPS: {self.clock.get_fps() :.1f}')
+        self.profiler.lap('present')
+        self.accumulator = min(self.accumulator + self.clock.tick(FPS), SIM_MAX_STEPS * SIM_STEP)
+
+    def update_display(self):
+        """Present only the screen areas the HUD changed, for screens nothing else draws on"""
+        dirty_rects = self.object_renderer.hud.get_dirty_rects()
+        if dirty_rects:
+            pg.display.update(dirty_rects)
+        self.clock.tick(FPS)
 
     def check_victory(self):
         """Check if all demons are eliminated for victory condition"""
-        if len([npc for npc in self.object_handler.npc_list if npc.alive]) == 0:
+        if not self.object_handler.get_alive_count():
             self.is_victory = True
 
     def draw(self):
-        """Render game objects to the screen"""
+        """Render game objects to the screen, between the last two simulation steps"""
+        player, npc_store, profiler = self.player, self.object_handler.npc_store, self.profiler
+        player.interpolate(self.alpha)
+        npc_store.interpolate(self.alpha)
+        self.raycasting.update()
+        profiler.lap('raycasting')
+        self.object_handler.project_sprites()
+        profiler.lap('projection')
         self.object_renderer.draw()
         self.weapon.draw()
+        profiler.lap('hud')
+        if profiler.visible:
+            profiler.draw(self.screen)
+            profiler.lap('profiler')
+        player.restore()
+        npc_store.restore()
 
     def check_events(self):
         """Handle game events and user input"""
-        self.global_trigger = False
         for event in pg.event.get():
             # Handle quit events
             if event.type == pg.QUIT or (event.type == pg.KEYDOWN and event.key == pg.K_ESCAPE):
                 pg.quit()
                 sys.exit()
-            # Handle global game events
-            elif event.type == self.global_event:
-                self.global_trigger = True
+            # Profiler overlay and trace export
+            elif event.type == pg.KEYDOWN and event.key == pg.K_F3:
+                self.profiler.toggle()
+            elif event.type == pg.KEYDOWN and event.key == pg.K_F4:
+                print('Wrote', self.profiler.export_trace(PROFILER_TRACE_PATH.format(time=time.strftime('%Y%m%d_%H%M%S'))))
             # Handle player shooting
             self.player.single_fire_event(event)
 
@@ -92,18 +188,56 @@ class Game:
             self.new_game()
 
     def run(self):
-        """Main game loop"""
+        """Main game loop, stepping game logic at SIM_HZ and drawing as often as FPS allows"""
         while True:
             self.check_events()
             if not self.player.is_alive:
                 self.object_renderer.game_over()
+                self.update_display()
             elif self.is_victory:
                 self.object_renderer.victory()
+                self.update_display()
             else:
-                self.update()
+                self.profiler.begin_frame()
+                self.simulate()
                 self.draw()
+                self.update_frame()
+
+    def run_headless(self, seconds, render_interval=0):
+        """
+        Step game logic back to back for seconds of game time, as fast as it runs, returning the
+        steps taken. Every render_interval steps a frame is drawn to the off-screen display, other
+        steps only work out the NPC projection their logic reads.
+        """
+        steps = round(seconds * SIM_HZ)
+        for step in range(1, steps + 1):
+            self.profiler.begin_frame()
+            if render_interval and not step % render_interval:
+                self.draw()
+            else:
+                self.object_handler.project_sprites(draw=False)
+            self.update()
+            if self.is_victory:
+                return step
+        return steps
 
 
 if __name__ == '__main__':
-    game = Game()
-    game.run()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Demon Hunter')
+    parser.add_argument('--map', help='map file from make_map.py to play instead of the shipped map')
+    parser.add_argument('--headless', action='store_true', help='simulate without a window or sound, uncapped')
+    parser.add_argument('--seconds', type=float, default=60, help='game seconds to simulate when headless')
+    parser.add_argument('--render-interval', type=int, default=0,
+                        help='steps between off-screen frames when headless, 0 to never draw')
+    args = parser.parse_args()
+
+    game = Game(headless=args.headless, level=args.map)
+    if args.headless:
+        time_start = time.perf_counter()
+        steps = game.run_headless(args.seconds, args.render_interval)
+        wall_time = time.perf_counter() - time_start
+        game_time = steps * SIM_STEP / 1000
+        print(f'{game_time:.1f} game seconds in {wall_time:.2f} s ({game_time / wall_time:.0f}x real time),'
+              f' {game.object_handler.get_alive_count()} NPCs alive, player health {game.player.health}')
+    else:
+        game.run()
\ No newline at end of file
@@ -0,0 +1,34 @@
+"""
+Writes a map file, which Map reads a chunk at a time: the built-in level, or a generated one
+for trying out large levels. Run with: python make_map.py --size 2048 2048 big.map
+"""
+import argparse
+import time
+
+import numpy as np
+
+from map import encode_map, generate_map, mini_map
+from settings import MAP_CHUNK_SIZE
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('output')
+    parser.add_argument('--size', type=int, nargs=2, metavar=('COLS', 'ROWS'), help='generate a level this size')
+    parser.add_argument('--density', type=float, default=0.2, help='wall density of a generated level')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--chunk-size', type=int, default=MAP_CHUNK_SIZE, help='tiles per side of a chunk')
+    args = parser.parse_args()
+
+    time_start = time.perf_counter()
+    level = generate_map(*args.size, args.density, seed=args.seed) if args.size else mini_map
+    data = encode_map(level, args.chunk_size)
+    with open(args.output, 'wb') as file:
+        file.write(data)
+    rows, cols = np.shape(level)
+    print(f'wrote {cols}x{rows} tiles in {len(data) / 2 ** 20:.1f} MB to {args.output}'
+          f' ({time.perf_counter() - time_start:.1f} s)')
+
+
+if __name__ == '__main__':
+    main()
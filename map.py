@@ -1,4 +1,10 @@
 import pygame as pg
+import numpy as np
+import mmap
+import random
+import struct
+from settings import *
+from visibility import VisibilitySet
 
 _ = False
 mini_map = [
@@ -27,18 +33,280 @@ mini_map = [
     [1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1],
 ]
 
+
+def generate_map(cols, rows, density=0.2, seed=None):
+    """Random walled level in the mini_map layout, for testing maps larger than the shipped one"""
+    rng = random.Random(seed)
+    return [[1 if x in (0, cols - 1) or y in (0, rows - 1) or rng.random() < density else _
+             for x in range(cols)] for y in range(rows)]
+
+
+MAP_MAGIC = b'DHMAP001'
+MAP_HEADER = struct.Struct('<4I')  # cols, rows, chunk size, stored chunks
+MAP_ALIGNMENT = 4096  # chunk data starts on a page boundary, so chunks of a page each map cleanly
+
+
+def encode_map(level, chunk_size=MAP_CHUNK_SIZE):
+    """
+    Map file bytes for a level given as rows of wall ids. The level is cut into square chunks,
+    listed row by row in a table of 1-based indexes into the stored chunks that follow it, with 0
+    for a chunk of only floor. Identical chunks are stored once.
+    """
+    if chunk_size & (chunk_size - 1):
+        raise ValueError(f'chunk size {chunk_size} is not a power of two')
+    grid = np.asarray(level, dtype=np.uint8)
+    rows, cols = grid.shape
+    chunk_rows, chunk_cols = -(-rows // chunk_size), -(-cols // chunk_size)
+    padded = np.zeros((chunk_rows * chunk_size, chunk_cols * chunk_size), dtype=np.uint8)
+    padded[:rows, :cols] = grid
+    chunks = padded.reshape(chunk_rows, chunk_size, chunk_cols, chunk_size).swapaxes(1, 2).reshape(-1, chunk_size ** 2)
+
+    table = np.zeros(len(chunks), dtype=np.uint32)
+    stored = {}  # chunk bytes -> index, in order of first use
+    for chunk_id in np.flatnonzero(chunks.any(axis=1)).tolist():
+        table[chunk_id] = stored.setdefault(chunks[chunk_id].tobytes(), len(stored) + 1)
+
+    header = MAP_MAGIC + MAP_HEADER.pack(cols, rows, chunk_size, len(stored)) + table.tobytes()
+    return header.ljust(-(-len(header) // MAP_ALIGNMENT) * MAP_ALIGNMENT, b'\0') + b''.join(stored)
+
+
+def save_map(path, level, chunk_size=MAP_CHUNK_SIZE):
+    with open(path, 'wb') as file:
+        file.write(encode_map(level, chunk_size))
+
+
 class Map:
-    def __init__(self, game):
+    """
+    Wall ids of the level in square chunks, read through get_tile, is_wall, get_tiles and
+    is_wall_array. A level given as a list is held whole. A map file written by save_map is
+    memory-mapped, and only a window of chunks around the player, which the view and nearby
+    NPCs read, is held as one array. Lookups beyond it copy chunks into a pool of MAP_MAX_CHUNKS,
+    evicting the farthest from the player. A lookup that needs more grows the pool until it has
+    its tiles. So tile memory follows how far lookups reach rather than the level size.
+    """
+    def __init__(self, game, level=mini_map):
+        """level is a list of rows of wall ids, or the path of a map file"""
         self.game = game
-        self.mini_map = mini_map
-        self.world_map = {}
-        self.get_map()
+        if isinstance(level, str):
+            with open(level, 'rb') as file:
+                self.source = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self.source = encode_map(level)
+        if self.source[:len(MAP_MAGIC)] != MAP_MAGIC:
+            raise ValueError(f'{level} is not a map file')
+        self.cols, self.rows, self.chunk_size, _ = MAP_HEADER.unpack_from(self.source, len(MAP_MAGIC))
+        self.chunk_shift = self.chunk_size.bit_length() - 1
+        self.chunk_mask = self.chunk_size - 1
+        self.chunk_area = self.chunk_size ** 2
+        self.chunk_cols = -(-self.cols // self.chunk_size)
+        self.chunk_rows = -(-self.rows // self.chunk_size)
+        num_chunks = self.chunk_cols * self.chunk_rows
+        table_start = len(MAP_MAGIC) + MAP_HEADER.size
+        self.chunk_table = np.frombuffer(self.source, dtype=np.uint32, count=num_chunks, offset=table_start)
+        self.data_start = -(-(table_start + self.chunk_table.nbytes) // MAP_ALIGNMENT) * MAP_ALIGNMENT
+
+        # chunks around the player as one array, with a border of floor where it meets the map edge
+        self.window_radius = MAP_WINDOW_RADIUS if isinstance(self.source, mmap.mmap) else max(self.chunk_cols, self.chunk_rows)
+        self.window_chunk = None
+        self.window_rect = 0, 0, 0, 0  # tiles it covers, x0, y0, x1, y1
+        self.window_cols = 0
+        self.window = np.zeros(0, dtype=np.uint8)  # flat, row-major
+        self.window_view = memoryview(self.window)  # for scalar lookups
+        self.window_whole = False  # the window covers the whole map
+        player = getattr(game, 'player', None)
+        x, y = player.map_pos if player is not None else (int(PLAYER_POS[0]), int(PLAYER_POS[1]))
+        self.update_window(x >> self.chunk_shift, y >> self.chunk_shift)
+        self.start_pos = self.get_start_pos()
+
+        # other chunks read, in pool rows: slots maps chunk id to row, slot_chunks row to chunk id, -1 for none
+        self.max_chunks = 0 if self.window_whole else min(MAP_MAX_CHUNKS, num_chunks)
+        self.pool = np.zeros((self.max_chunks, self.chunk_area), dtype=np.uint8)
+        self.slots = np.full(num_chunks, -1, dtype=np.int32)
+        self.slot_chunks = np.full(self.max_chunks, -1, dtype=np.int64)
+        self.chunk_views = [None] * num_chunks  # memoryview of each pooled chunk's row, for scalar lookups
+        self.paged_in = 0
+        self.evicted = 0
+        self.visibility = VisibilitySet(self)
+
+    def get_start_pos(self):
+        """PLAYER_POS where it is floor, else the centre of the first floor tile row by row"""
+        x, y = int(PLAYER_POS[0]), int(PLAYER_POS[1])
+        if 0 <= x < self.cols and 0 <= y < self.rows and not self.is_wall(x, y):
+            return PLAYER_POS
+        for y in range(self.rows):
+            for x in range(self.cols):
+                if not self.is_wall(x, y):
+                    return x + 0.5, y + 0.5
+        raise ValueError('the level has no floor')
+
+    def update(self):
+        """Move the window when the player enters another chunk, and build visibility rows around the player"""
+        if not self.window_whole:
+            x, y = self.game.player.map_pos
+            chunk = x >> self.chunk_shift, y >> self.chunk_shift
+            if chunk != self.window_chunk:
+                self.update_window(*chunk)
+        self.visibility.update()
+
+    def update_window(self, chunk_x, chunk_y):
+        size, radius = self.chunk_size, self.window_radius
+        chunk_x0, chunk_y0 = max(0, chunk_x - radius), max(0, chunk_y - radius)
+        chunk_x1, chunk_y1 = min(self.chunk_cols, chunk_x + radius + 1), min(self.chunk_rows, chunk_y + radius + 1)
+        x0, y0 = chunk_x0 * size - (chunk_x0 == 0), chunk_y0 * size - (chunk_y0 == 0)
+        x1 = chunk_x1 * size + (chunk_x1 == self.chunk_cols)
+        y1 = chunk_y1 * size + (chunk_y1 == self.chunk_rows)
+        window = np.zeros((y1 - y0, x1 - x0), dtype=np.uint8)
+        for y in range(chunk_y0, chunk_y1):
+            for x in range(chunk_x0, chunk_x1):
+                window[y * size - y0:(y + 1) * size - y0, x * size - x0:(x + 1) * size - x0] = \
+                    self.read_chunk(y * self.chunk_cols + x).reshape(size, size)
+        self.window_chunk = chunk_x, chunk_y
+        self.window_rect = x0, y0, x1, y1
+        self.window_cols = x1 - x0
+        self.window = window.ravel()
+        self.window_view = memoryview(self.window)
+        self.window_whole = (chunk_x0, chunk_y0, chunk_x1, chunk_y1) == (0, 0, self.chunk_cols, self.chunk_rows)
+
+    def read_chunk(self, chunk_id):
+        """Wall ids of a chunk, row by row, copied out of the map"""
+        index = int(self.chunk_table[chunk_id])
+        if not index:
+            return np.zeros(self.chunk_area, dtype=np.uint8)
+        start = self.data_start + (index - 1) * self.chunk_area
+        chunk = np.frombuffer(self.source, dtype=np.uint8, count=self.chunk_area, offset=start).copy()
+        if isinstance(self.source, mmap.mmap) and hasattr(mmap, 'MADV_DONTNEED'):
+            # held by the copy, so the mapped pages can go back to the page cache
+            offset = start % mmap.PAGESIZE
+            self.source.madvise(mmap.MADV_DONTNEED, start - offset, self.chunk_area + offset)
+        return chunk
+
+    def is_wall(self, x, y):
+        # the window lookup is repeated from get_tile, collision and graph building call this a lot
+        x0, y0, x1, y1 = self.window_rect
+        if x0 <= x < x1 and y0 <= y < y1:
+            return self.window_view[(y - y0) * self.window_cols + x - x0] > 0
+        return self.get_tile(x, y) > 0
+
+    def get_tile(self, x, y):
+        x0, y0, x1, y1 = self.window_rect
+        if x0 <= x < x1 and y0 <= y < y1:
+            return self.window_view[(y - y0) * self.window_cols + x - x0]
+        if 0 <= x < self.cols and 0 <= y < self.rows:
+            shift, mask = self.chunk_shift, self.chunk_mask
+            chunk_id = (y >> shift) * self.chunk_cols + (x >> shift)
+            chunk = self.chunk_views[chunk_id]
+            if chunk is None:
+                chunk = self.chunk_views[self.page_in([chunk_id])[0]]
+            return chunk[(y & mask) << shift | x & mask]
+        return 0
+
+    def get_tiles(self, xs, ys):
+        """Bulk lookup of wall ids for integer coordinate arrays, 0 for floor or outside the map"""
+        xs, ys = xs.clip(-1, self.cols), ys.clip(-1, self.rows)
+        x0, y0, x1, y1 = self.window_rect
+        if self.window_whole or not xs.size or (x0 <= xs.min() and xs.max() < x1 and y0 <= ys.min() and ys.max() < y1):
+            # in place on the clipped copies, the lookups are large enough for temporaries to show
+            ys *= self.window_cols
+            ys += xs
+            ys -= y0 * self.window_cols + x0
+            return self.window.take(ys)
+        return self.get_pooled_tiles(xs, ys)
+
+    def get_pooled_tiles(self, xs, ys):
+        """get_tiles for lookups reaching outside the window, through the chunk pool"""
+        inside = (xs >= 0) & (xs < self.cols) & (ys >= 0) & (ys < self.rows)
+        xs, ys = xs.clip(0, self.cols - 1), ys.clip(0, self.rows - 1)
+        shift, mask = self.chunk_shift, self.chunk_mask
+        chunk_ids = (ys >> shift) * self.chunk_cols + (xs >> shift)
+        slots = self.slots[chunk_ids]
+        missing = slots < 0
+        if missing.any():
+            self.page_in(np.unique(chunk_ids[missing]).tolist(), keep=np.unique(chunk_ids))
+            slots = self.slots[chunk_ids]
+        tiles = np.where(inside, self.pool.take(slots * self.chunk_area + ((ys & mask) << shift | xs & mask)), 0)
+        if len(self.pool) > self.max_chunks:
+            self.shrink()
+        return tiles
+
+    def is_wall_array(self, xs, ys):
+        return self.get_tiles(xs, ys) > 0
+
+    def page_in(self, chunk_ids, keep=()):
+        """Copy chunks into the pool, evicting others that are not in keep if it is full, returning chunk_ids"""
+        for chunk_id in chunk_ids:
+            free = np.flatnonzero(self.slot_chunks < 0)
+            slot = free[0] if len(free) else self.evict(keep)
+            self.pool[slot] = self.read_chunk(chunk_id)
+            self.slots[chunk_id] = slot
+            self.slot_chunks[slot] = chunk_id
+            self.chunk_views[chunk_id] = memoryview(self.pool[slot])
+            self.paged_in += 1
+        return chunk_ids
+
+    def evict(self, keep):
+        """Free the pool row of the chunk farthest from the player, growing the pool if every chunk is kept"""
+        chunk_ids = self.slot_chunks
+        distance = self.get_distances(chunk_ids)
+        distance[np.isin(chunk_ids, keep)] = -1
+        slot = int(distance.argmax()) if len(distance) else 0
+        if not len(distance) or distance[slot] < 0:
+            return self.grow()
+        chunk_id = chunk_ids[slot]
+        self.slots[chunk_id] = -1
+        self.chunk_views[chunk_id] = None
+        self.slot_chunks[slot] = -1
+        self.evicted += 1
+        return slot
+
+    def get_distances(self, chunk_ids):
+        """How many chunks across and down each chunk is from the player's"""
+        player = getattr(self.game, 'player', None)
+        x, y = player.map_pos if player is not None else (0, 0)
+        return (np.abs(chunk_ids % self.chunk_cols - (x >> self.chunk_shift)) +
+                np.abs(chunk_ids // self.chunk_cols - (y >> self.chunk_shift)))
+
+    def grow(self):
+        """
+        Double the pool when one lookup needs more chunks than it holds, returning the first new
+        row. The lookup shrinks it back once it has its tiles.
+        """
+        slot = len(self.pool)
+        self.pool = np.vstack((self.pool, np.zeros((max(1, slot), self.chunk_area), dtype=np.uint8)))
+        self.slot_chunks = np.append(self.slot_chunks, np.full(len(self.pool) - slot, -1))
+        for chunk_id in self.slot_chunks[:slot].tolist():
+            self.chunk_views[chunk_id] = memoryview(self.pool[self.slots[chunk_id]])
+        return slot
+
+    def shrink(self):
+        """Evict the chunks farthest from the player until the pool fits in MAP_MAX_CHUNKS rows again"""
+        rows = np.flatnonzero(self.slot_chunks >= 0)
+        chunk_ids = self.slot_chunks[rows]
+        order = np.argsort(self.get_distances(chunk_ids), kind='stable')
+        for chunk_id in chunk_ids[order[self.max_chunks:]].tolist():
+            self.slots[chunk_id] = -1
+            self.chunk_views[chunk_id] = None
+            self.evicted += 1
+        rows = rows[order[:self.max_chunks]]
+        kept = self.slot_chunks[rows]
+        pool = np.zeros((self.max_chunks, self.chunk_area), dtype=np.uint8)
+        pool[:len(rows)] = self.pool[rows]
+        self.pool = pool
+        self.slot_chunks = np.full(self.max_chunks, -1, dtype=np.int64)
+        self.slot_chunks[:len(kept)] = kept
+        self.slots[kept] = np.arange(len(kept))
+        for slot, chunk_id in enumerate(kept.tolist()):
+            self.chunk_views[chunk_id] = memoryview(self.pool[slot])
 
-    def get_map(self):
-        for j, row in enumerate(self.mini_map):
-            for i, value in enumerate(row):
-                if value:
-                    self.world_map[(i,j)] = value
+    def get_stats(self):
+        return {
+            'chunks': len(self.chunk_views),
+            'window_bytes': self.window.nbytes,
+            'pooled': int((self.slot_chunks >= 0).sum()),
+            'pool_bytes': self.pool.nbytes,
+            'paged_in': self.paged_in,
+            'evicted': self.evicted,
+        }
 
     def draw(self):
-        [pg.draw.rect(self.game.screen, 'darkgray', (pos[0]*100, pos[1] * 100, 100, 100), 2) for pos in self.world_map]
\ No newline at end of file
+        [pg.draw.rect(self.game.screen, 'darkgray', (x * 100, y * 100, 100, 100), 2)
+         for y in range(self.rows) for x in range(self.cols) if self.is_wall(x, y)]
@@ -1,132 +1,58 @@
 from sprite_object import *
-from random import randint, random, choice
 
 
-class NPC(AnimatedSprites):
+def store_field(name):
+    """Property reading and writing this NPC's row of an NPCStore array"""
+    def get(self):
+        return getattr(self.store, name)[self.index]
+
+    def set(self, value):
+        getattr(self.store, name)[self.index] = value
+    return property(get, set)
+
+
+class NPC(SpriteObject):
+    """Facade over one row of the object handler's NPCStore, which runs the NPC logic in batches"""
+    __slots__ = ('store', 'index')
+
     def __init__(self, game, path='resources/sprites/npc/soldier/0.png',
                  pos=(10.5, 5.5), scale=0.6, shift=0.38, animation_time=180):
-        super().__init__(game, path, pos, scale, shift, animation_time)
-        self.attack_images = self.get_images(self.path + '/attack')
-        self.death_images = self.get_images(self.path + '/death')
-        self.idle_images = self.get_images(self.path + '/idle')
-        self.pain_images = self.get_images(self.path + '/pain')
-        self.walk_images = self.get_images(self.path + '/walk')
-
-        self.attack_dist = randint(3, 6)
-        self.speed = 0.03
-        self.size = 10
-        self.health = 100
-        self.attack_damage = 10
-        self.accuracy = 0.15
-        self.alive = True
-        self.pain = False
-        self.ray_cast_value = False
-        self.frame_counter = 0
-        self.player_search_trigger = False
-        self.dist = float('inf')
-        self.norm_dist = float('inf')
-
-
-    def update(self):
-        self.check_animation_time()
-        self.get_sprite()
-        self.run_logic()
-        # self.draw_ray_cast()
-
-    def check_wall(self, x, y):
-        return (x, y) not in self.game.map.world_map
-
-    def check_wall_collision(self, dx, dy):
-        # Check both x and y coordinates with size for diagonal movement
-        next_x = int(self.x + dx * self.size)
-        next_y = int(self.y + dy * self.size)
-
-        # Check diagonal collision first
-        if (next_x, next_y) not in self.game.map.world_map:
-            # Then check individual axes
-            if dx and self.check_wall(next_x, int(self.y)):
-                self.x += dx
-            if dy and self.check_wall(int(self.x), next_y):
-                self.y += dy
-
-    def movement(self):
-        next_pos = self.game.pathfinding.get_path(self.map_pos, self.game.player.map_pos)
-        next_x, next_y = next_pos
-
-        try:
-            # Calculate distance to player
-            ox, oy = self.game.player.pos
-            self.dist = math.hypot(next_x - ox, next_y - oy)  # Add this line
-
-            if next_pos not in self.game.object_handler.npc_positions:
-                angle = math.atan2(next_y + 0.5 - self.y, next_x + 0.5 - self.x)
-                dx = math.cos(angle) * self.speed
-                dy = math.sin(angle) * self.speed
-                self.check_wall_collision(dx, dy)
-        except:
-            self.dist = float('inf')
-
-    def attack(self):
-        if self.animation_trigger and self.ray_cast_value:  # Only attack if player is visible
-            if HALF_WIDTH - self.sprite_half_width < self.screen_x < HALF_WIDTH + self.sprite_half_width:  # Check if NPC is on screen
-                self.game.sound.npc_shot.play()
-                if random() < self.accuracy:
-                    self.game.player.get_damage(self.attack_damage)
-
-    def animate_death(self):
-        if not self.alive:
-            if self.game.global_trigger and self.frame_counter < len(self.death_images) - 1:
-                self.death_images.rotate(-1)
-                self.image = self.death_images[0]
-                self.frame_counter += 1
-
-
-
-    def animate_pain(self):
-        self.animate(self.pain_images)
-        if self.animation_trigger:
-            self.pain = False
-
-    def check_hit_in_npc(self):
-        if self.ray_cast_value and self.game.player.shot:
-            if HALF_WIDTH - self.sprite_half_width < self.screen_x < HALF_WIDTH + self.sprite_half_width and self.norm_dist < 10:  # Added distance check
-                self.game.sound.npc_pain.play()
-                self.game.player.shot = False
-                self.pain = True
-                self.health -= self.game.weapon.damage
-                self.check_health()
+        self.game = game
+        self.player = game.player
+        self.store = game.object_handler.npc_store
+        self.index = self.store.add(self, path, pos, animation_time)
+        self.IMAGE_WIDTH = self.image.get_width()
+        self.IMAGE_HALF_WIDTH = self.image.get_width() // 2
+        self.IMAGE_RATIO = self.IMAGE_WIDTH / self.image.get_height()
+        self.SPRITE_SCALE = scale
+        self.SPRITE_HEIGHT_SHIFT = shift
+
+    x = store_field('x')
+    y = store_field('y')
+    theta = store_field('theta')
+    screen_x = store_field('screen_x')
+    dist = store_field('dist')
+    norm_dist = store_field('norm_dist')
+    sprite_half_width = store_field('sprite_half_width')
+    health = store_field('health')
+    attack_damage = store_field('attack_damage')
+    attack_dist = store_field('attack_dist')
+    speed = store_field('speed')
+    accuracy = store_field('accuracy')
+    size = store_field('size')
+    alive = store_field('alive')
+    pain = store_field('pain')
+    ray_cast_value = store_field('ray_cast_value')
+    player_search_trigger = store_field('player_search_trigger')
+    frame_counter = store_field('frame_counter')
+    animation_trigger = store_field('animation_trigger')
 
+    @property
+    def image(self):
+        return self.store.get_image(self.index)
 
     def check_health(self):
-        if self.health < 1:
-            self.alive = False
-            self.game.sound.npc_death.play()
-
-    def run_logic(self):
-        if self.alive:
-            self.ray_cast_value = self.ray_cast_player_npc()
-            self.check_hit_in_npc()
-
-            if self.pain:
-                self.animate_pain()
-            elif self.ray_cast_value:
-                self.player_search_trigger = True
-
-                if self.dist < self.attack_dist:
-                    self.animate(self.attack_images)
-                    self.attack()
-                else:
-                    self.animate(self.walk_images)
-                    self.movement()
-
-            elif self.player_search_trigger:
-                self.animate(self.walk_images)
-                self.movement()
-
-            else:
-                self.animate(self.idle_images)
-        else:
-            self.animate_death()
+        self.store.check_health(self.index)
 
     @property
     def map_pos(self):
@@ -161,7 +87,7 @@ class NPC(AnimatedSprites):
             if tile_hor == self.map_pos:
                 player_dist_h = depth_hor
                 break
-            if tile_hor in self.game.map.world_map:
+            if self.game.map.is_wall(*tile_hor):
                 wall_dist_h = depth_hor
                 break
             x_hor += dx
@@ -182,7 +108,7 @@ class NPC(AnimatedSprites):
             if tile_vert == self.map_pos:
                 player_dist_v = depth_vert
                 break
-            if tile_vert in self.game.map.world_map:
+            if self.game.map.is_wall(*tile_vert):
                 wall_dist_v = depth_vert
                 break
             x_vert += dx
@@ -215,7 +141,7 @@ class CacoDemonNPC(NPC):
         self.attack_dist = 1.5
         self.health = 150
         self.attack_damage = 25
-        self.speed = 0.05
+        self.speed = 0.003
         self.accuracy = 0.35
         self.size = 20  # Increased collision size for CacoDemon
 
@@ -226,5 +152,5 @@ class CyberDemonNPC(NPC):
         self.attack_dist = 6.0
         self.health = 350
         self.attack_damage = 45
-        self.speed = 0.035
+        self.speed = 0.0021
         self.accuracy = 0.25
@@ -0,0 +1,330 @@
+import numpy as np
+import time
+from random import random, randint
+from settings import *
+from assets import assets
+
+
+class NPCStore:
+    """
+    State of every NPC in typed arrays, one row per NPC, so animation, line of sight,
+    movement and state changes run as array operations instead of a method chain per NPC.
+    NPC objects are facades onto a row. Frame sequences are loaded once per NPC type.
+
+    Line of sight and path queries are the expensive part, so they are scheduled: each NPC
+    rethinks at an interval set by its distance, visibility and alert state, and due NPCs are
+    handled oldest first in slices until the frame's budget runs out. Everything else runs
+    every frame on the last results.
+    """
+    IDLE, WALK, ATTACK, PAIN, DEATH, BASE = range(6)
+    SEQUENCES = 'idle', 'walk', 'attack', 'pain', 'death'
+
+    FIELDS = {
+        # position and the projection written by ObjectHandler.project_sprites
+        'x': np.float64, 'y': np.float64, 'theta': np.float64, 'screen_x': np.float64,
+        'dist': np.float64, 'norm_dist': np.float64, 'sprite_half_width': np.float64,
+        # position before the last simulation step, drawing blends between the two
+        'prev_x': np.float64, 'prev_y': np.float64,
+        # stats
+        'health': np.int32, 'attack_damage': np.int32, 'attack_dist': np.float32,
+        'speed': np.float32, 'accuracy': np.float32, 'size': np.float32,
+        # AI state
+        'alive': np.bool_, 'pain': np.bool_, 'ray_cast_value': np.bool_, 'player_search_trigger': np.bool_,
+        # animation, image_state and frame pick the shown image from the type's sequences
+        'kind': np.uint16, 'image_state': np.uint8, 'frame': np.uint16, 'frame_counter': np.uint16,
+        'animation_time': np.int32, 'animation_time_prev': np.int64, 'animation_trigger': np.bool_,
+        # scheduling, in update counts, and the path step found by the last think
+        'last_think': np.int64, 'next_think': np.int64,
+        'next_tile_x': np.int32, 'next_tile_y': np.int32, 'path_blocked': np.bool_,
+    }
+
+    def __init__(self, game, capacity=64):
+        self.game = game
+        self.count = 0
+        self.capacity = capacity
+        self.frame_number = 0
+        self.sim_x = self.sim_y = None  # positions of the latest step while drawing interpolated ones
+        self.thought = 0  # NPCs that thought in the last update
+        self.npcs = []  # facades by row
+        for name, dtype in self.FIELDS.items():
+            setattr(self, name, np.zeros(capacity, dtype=dtype))
+
+        # per NPC type: frame sequences by state, plus the base image as the BASE sequence
+        self.kind_ids = {}
+        self.kind_frames = []
+        self.kind_lengths = np.zeros((0, len(self.SEQUENCES) + 1), dtype=np.uint16)
+
+    def add(self, npc, path, pos, animation_time):
+        """Append a row with the defaults of a basic soldier, returning its index"""
+        if self.count == self.capacity:
+            self.grow()
+        index = self.count
+        self.count += 1
+        self.npcs.append(npc)
+
+        self.x[index], self.y[index] = self.prev_x[index], self.prev_y[index] = pos
+        self.dist[index] = self.norm_dist[index] = float('inf')
+        self.health[index] = 100
+        self.attack_damage[index] = 10
+        self.attack_dist[index] = randint(3, 6)
+        self.speed[index] = ENEMY_SPEED
+        self.accuracy[index] = 0.15
+        self.size[index] = 10
+        self.alive[index] = True
+        self.kind[index] = self.get_kind(path)
+        self.image_state[index] = self.BASE
+        self.animation_time[index] = animation_time
+        self.animation_time_prev[index] = self.game.time
+        self.last_think[index] = self.next_think[index] = self.frame_number
+        self.next_tile_x[index] = self.next_tile_y[index] = -1
+        return index
+
+    def reset(self):
+        """Drop every NPC, keeping the arrays and the loaded NPC types"""
+        for name in self.FIELDS:
+            getattr(self, name)[:] = 0
+        self.count = 0
+        self.frame_number = 0
+        self.sim_x = self.sim_y = None
+        self.thought = 0
+        self.npcs = []
+
+    def grow(self):
+        self.capacity *= 2
+        for name in self.FIELDS:
+            array = getattr(self, name)
+            grown = np.zeros(self.capacity, dtype=array.dtype)
+            grown[:len(array)] = array
+            setattr(self, name, grown)
+
+    def save_state(self):
+        """Remember positions before a simulation step"""
+        self.prev_x[:self.count] = self.x[:self.count]
+        self.prev_y[:self.count] = self.y[:self.count]
+
+    def interpolate(self, alpha):
+        """Take positions alpha of the way from the previous step to the latest until restore"""
+        self.sim_x, self.sim_y = self.x, self.y
+        self.x = self.prev_x + (self.x - self.prev_x) * alpha
+        self.y = self.prev_y + (self.y - self.prev_y) * alpha
+
+    def restore(self):
+        self.x, self.y = self.sim_x, self.sim_y
+
+    def get_kind(self, path):
+        """Id of the NPC type whose base image is at path, loading its sequences on first use"""
+        kind = self.kind_ids.get(path)
+        if kind is None:
+            folder = path.rsplit('/', 1)[0]
+            frames = [assets.get_sequence(folder + '/' + sequence) for sequence in self.SEQUENCES]
+            frames.append((assets.get_image(path),))
+            kind = self.kind_ids[path] = len(self.kind_frames)
+            self.kind_frames.append(frames)
+            self.kind_lengths = np.vstack((self.kind_lengths, [len(sequence) for sequence in frames]))
+        return kind
+
+    def get_image(self, index):
+        return self.kind_frames[self.kind[index]][self.image_state[index]][self.frame[index]]
+
+    def get_tiles(self):
+        return zip(self.x[:self.count].astype(np.int32).tolist(), self.y[:self.count].astype(np.int32).tolist())
+
+    def get_memory(self):
+        """Bytes held by the arrays and by the shared frames"""
+        array_bytes = sum(getattr(self, name).nbytes for name in self.FIELDS)
+        frame_bytes = sum(assets.get_size(image)
+                          for frames in self.kind_frames for sequence in frames for image in sequence)
+        return array_bytes, frame_bytes
+
+    def update(self):
+        if not self.count:
+            return
+        self.frame_number += 1
+        self.check_animation_time()
+        alive = np.flatnonzero(self.alive[:self.count])
+        dead = np.flatnonzero(~self.alive[:self.count])
+
+        if len(alive):
+            self.schedule(alive)
+            self.check_hit_in_npc(alive)
+
+            # every NPC alive at the start of the frame takes exactly one branch
+            pain = alive[self.pain[alive]]
+            calm = alive[~self.pain[alive]]
+            seen = calm[self.ray_cast_value[calm]]
+            self.player_search_trigger[seen] = True
+            attacking = seen[self.dist[seen] < self.attack_dist[seen]]
+            searching = calm[~self.ray_cast_value[calm] & self.player_search_trigger[calm]]
+            walking = np.concatenate((seen[self.dist[seen] >= self.attack_dist[seen]], searching))
+            idle = calm[~self.ray_cast_value[calm] & ~self.player_search_trigger[calm]]
+
+            self.animate(pain, self.PAIN)
+            self.pain[pain[self.animation_trigger[pain]]] = False
+            self.animate(attacking, self.ATTACK)
+            self.attack(attacking)
+            self.animate(walking, self.WALK)
+            self.movement(walking)
+            self.animate(idle, self.IDLE)
+
+        self.animate_death(dead)
+
+    def schedule(self, alive):
+        """Let due NPCs think, oldest first, in slices until the budget is spent, at least one slice per frame"""
+        due = alive[self.next_think[alive] <= self.frame_number]
+        due = due[np.argsort(self.last_think[due], kind='stable')]
+        self.thought = 0
+        time_start = time.perf_counter()
+        for start in range(0, len(due), AI_THINK_BATCH):
+            self.think(due[start:start + AI_THINK_BATCH])
+            self.thought = min(len(due), start + AI_THINK_BATCH)
+            if (time.perf_counter() - time_start) * 1000 > AI_THINK_BUDGET:
+                break
+
+    def think(self, indices):
+        self.ray_cast_value[indices] = self.check_line_of_sight(indices)
+        self.find_next_tiles(indices[self.ray_cast_value[indices] | self.player_search_trigger[indices]])
+        self.last_think[indices] = self.frame_number
+        self.next_think[indices] = self.frame_number + self.get_think_interval(indices)
+
+    def get_think_interval(self, indices):
+        dist = self.dist[indices]
+        near = (dist < AI_LOD_NEAR) | self.ray_cast_value[indices] | self.pain[indices]
+        mid = (dist < AI_LOD_FAR) | self.player_search_trigger[indices]
+        return np.select((near, mid), AI_LOD_INTERVALS[:2], AI_LOD_INTERVALS[2])
+
+    def check_animation_time(self):
+        count = self.count
+        time_now = self.game.time
+        trigger = time_now - self.animation_time_prev[:count] > self.animation_time[:count]
+        self.animation_trigger[:count] = trigger
+        self.animation_time_prev[:count][trigger] = time_now
+
+    def animate(self, indices, state):
+        indices = indices[self.animation_trigger[indices]]
+        length = self.kind_lengths[self.kind[indices], state]
+        self.frame[indices] = (self.frame[indices] + 1) % length
+        self.image_state[indices] = state
+
+    def animate_death(self, indices):
+        if not self.game.global_trigger:
+            return
+        indices = indices[self.frame_counter[indices] < self.kind_lengths[self.kind[indices], self.DEATH] - 1]
+        self.frame_counter[indices] += 1
+        self.frame[indices] = self.frame_counter[indices]
+        self.image_state[indices] = self.DEATH
+
+    def check_line_of_sight(self, indices):
+        """The map's visibility set decides most NPCs, the rest are ray cast together"""
+        player = self.game.player
+        tile_x, tile_y = self.x[indices].astype(np.int32), self.y[indices].astype(np.int32)
+        visible, undecided = self.game.map.visibility.test_tiles(player.map_pos, tile_x, tile_y)
+        undecided = np.flatnonzero(undecided)
+        if len(undecided):
+            visible[undecided] = self.ray_cast_player_npc(indices[undecided], tile_x[undecided], tile_y[undecided])
+        return visible
+
+    def ray_cast_player_npc(self, indices, tile_x, tile_y):
+        """NPC.ray_cast_player_npc for many NPCs, stepping every ray at once like the ray caster"""
+        ox, oy = self.game.player.pos
+        x_map, y_map = self.game.player.map_pos
+        sin_a, cos_a = np.sin(self.theta[indices]), np.cos(self.theta[indices])
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            #horizontals
+            y_hor = np.where(sin_a > 0, y_map + 1, y_map - 1e-6)
+            dy = np.where(sin_a > 0, 1, -1)
+            depth_hor = (y_hor - oy) / sin_a
+            x_hor = ox + depth_hor * cos_a
+            delta_depth = dy / sin_a
+            player_dist_h, wall_dist_h = self.march(x_hor, y_hor, delta_depth * cos_a, dy, depth_hor, delta_depth,
+                                                    tile_x, tile_y)
+
+            #verticals
+            x_vert = np.where(cos_a > 0, x_map + 1, x_map - 1e-6)
+            dx = np.where(cos_a > 0, 1, -1)
+            depth_vert = (x_vert - ox) / cos_a
+            y_vert = oy + depth_vert * sin_a
+            delta_depth = dx / cos_a
+            player_dist_v, wall_dist_v = self.march(x_vert, y_vert, dx, delta_depth * sin_a, depth_vert, delta_depth,
+                                                    tile_x, tile_y)
+
+        player_dist = np.maximum(player_dist_v, player_dist_h)
+        wall_dist = np.maximum(wall_dist_v, wall_dist_h)
+        # an NPC on the player's own tile is always seen
+        same_tile = (tile_x == x_map) & (tile_y == y_map)
+        return same_tile | ((0 < player_dist) & (player_dist < wall_dist)) | (wall_dist == 0)
+
+    def march(self, x, y, dx, dy, depth, delta_depth, tile_x, tile_y):
+        """Depths at which each ray first enters its NPC's tile or a wall, 0 where it does neither"""
+        steps = np.ones((len(x), MAX_DEPTH))
+        x = np.cumsum(np.column_stack((x, dx[:, None] * steps[:, 1:])), axis=1)
+        y = np.cumsum(np.column_stack((y, dy[:, None] * steps[:, 1:])), axis=1)
+        depth = np.cumsum(np.column_stack((depth, delta_depth[:, None] * steps[:, 1:])), axis=1)
+
+        ray_tile_x, ray_tile_y = x.astype(np.int64), y.astype(np.int64)
+        hit_npc = (ray_tile_x == tile_x[:, None]) & (ray_tile_y == tile_y[:, None])
+        hit = hit_npc | self.game.map.is_wall_array(ray_tile_x, ray_tile_y)
+        rays = np.arange(len(x))
+        step = hit.argmax(axis=1)
+        hit_depth = np.where(hit[rays, step], depth[rays, step], 0)
+        return np.where(hit_npc[rays, step], hit_depth, 0), np.where(hit_npc[rays, step], 0, hit_depth)
+
+    def is_centered(self, indices):
+        return np.abs(self.screen_x[indices] - HALF_WIDTH) < self.sprite_half_width[indices]
+
+    def check_hit_in_npc(self, indices):
+        player = self.game.player
+        if not player.shot:
+            return
+        hit = indices[self.ray_cast_value[indices] & self.is_centered(indices) & (self.norm_dist[indices] < 10)]
+        if len(hit):
+            # the shot stops at the first NPC in update order
+            index = hit[0]
+            self.game.sound.npc_pain.play()
+            player.shot = False
+            self.pain[index] = True
+            self.health[index] -= self.game.weapon.damage
+            self.check_health(index)
+
+    def check_health(self, index):
+        if self.health[index] < 1:
+            self.alive[index] = False
+            self.game.sound.npc_death.play()
+
+    def attack(self, indices):
+        shooting = indices[self.animation_trigger[indices] & self.ray_cast_value[indices] & self.is_centered(indices)]
+        for index in shooting.tolist():
+            self.game.sound.npc_shot.play()
+            if random() < self.accuracy[index]:
+                self.game.player.get_damage(int(self.attack_damage[index]))
+
+    def find_next_tiles(self, indices):
+        """Path step of each NPC and whether another NPC stands on it, kept until the NPC next thinks"""
+        if not len(indices):
+            return
+        is_npc_at = self.game.object_handler.is_npc_at
+        tiles = zip(self.x[indices].astype(np.int32).tolist(), self.y[indices].astype(np.int32).tolist())
+        next_tiles = self.game.pathfinding.get_paths(tiles, self.game.player.map_pos)
+        self.next_tile_x[indices], self.next_tile_y[indices] = np.array(next_tiles, dtype=np.int32).reshape(-1, 2).T
+        self.path_blocked[indices] = [is_npc_at(tile) for tile in next_tiles]
+
+    def movement(self, indices):
+        """Step every walking NPC towards its next path tile unless another NPC stands there"""
+        indices = indices[~self.path_blocked[indices] & (self.next_tile_x[indices] >= 0)]
+        next_x, next_y = self.next_tile_x[indices], self.next_tile_y[indices]
+        angle = np.arctan2(next_y + 0.5 - self.y[indices], next_x + 0.5 - self.x[indices])
+        speed = self.speed[indices] * SIM_STEP
+        self.check_wall_collision(indices, np.cos(angle) * speed, np.sin(angle) * speed)
+
+    def check_wall_collision(self, indices, dx, dy):
+        is_wall = self.game.map.is_wall_array
+        x, y, size = self.x[indices], self.y[indices], self.size[indices]
+        next_x = (x + dx * size).astype(np.int32)
+        next_y = (y + dy * size).astype(np.int32)
+
+        # the diagonal tile first, then each axis on its own
+        clear = ~is_wall(next_x, next_y)
+        x = np.where(clear & (dx != 0) & ~is_wall(next_x, y.astype(np.int32)), x + dx, x)
+        y = np.where(clear & (dy != 0) & ~is_wall(x.astype(np.int32), next_y), y + dy, y)
+        self.x[indices], self.y[indices] = x, y
+
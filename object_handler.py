@@ -1,18 +1,29 @@
 from sprite_object import *
 from npc import *
+from cache import SurfaceCache
+from spatial_grid import SpatialGrid
+from npc_store import NPCStore
+import numpy as np
 
 
 class ObjectHandler:
     def __init__(self, game):
         self.game = game
-        self.sprite_list = []
-        self.npc_list = []
+        # NPCs join the store as they are created, so they need to find it through the game
+        game.object_handler = self
+        self.npc_store = NPCStore(game)
+        self.sprite_cache = SurfaceCache(SPRITE_CACHE_MEMORY)  # scaled frames shared by every sprite
         self.npc_sprite_path = 'resources/sprites/npc/'
         self.static_sprite_path = 'resources/sprites/static_sprites/'
         self.anim_sprite_path = 'resources/sprites/animated_sprites/'
+        self.reset()
+
+    def reset(self):
+        """Place the level's sprites and NPCs afresh, keeping the loaded NPC types and the scaled frame cache"""
+        self.clear()
+        game = self.game
         add_sprite = self.add_sprite
         add_npc = self.add_npc
-        self.npc_positions = {}
 
         # Light placement in key areas
         add_sprite(AnimatedSprites(game, pos=(2.5, 2.5)))  # Starting area
@@ -40,14 +51,143 @@ class ObjectHandler:
 
         # Final boss in a strategic location
         add_npc(CyberDemonNPC(game, pos=(27.5, 18.5)))  # Final area boss
+        self.update_npc_grid()
+
+    def clear(self):
+        """Remove every sprite and NPC, for levels populated with add_sprite and add_npc instead"""
+        self.sprite_list = []
+        self.npc_store.reset()
+        self.npc_list = self.npc_store.npcs
+        self.npc_grid = SpatialGrid()  # alive NPCs by tile
+        self.npc_positions = set()
+        self.npc_positions_version = -1
+
+        # sprite then NPC positions in contiguous arrays for batched projection
+        self.entities = []
+        self.entity_x = np.zeros(0)
+        self.entity_y = np.zeros(0)
+        self.entity_half_width = np.zeros(0)
+        self.entity_scale = np.zeros(0)
+        self.entity_ratio = np.zeros(0)
+        self.entities_changed = False  # arrays are rebuilt once before the next projection
 
     def update(self):
-        self.npc_positions = {npc.map_pos for npc in self.npc_list if npc.alive}
-        [sprite.update() for sprite in self.sprite_list]
-        [npc.update() for npc in self.npc_list]
+        """NPC logic for one simulation step, reading the projection of the last drawn frame"""
+        [sprite.update_logic() for sprite in self.sprite_list]
+        self.npc_store.update()
+        self.update_npc_grid()
+
+    def update_npc_grid(self):
+        """Re-bucket NPCs that changed tile, drop dead ones, and refresh npc_positions if occupancy changed"""
+        npc_grid, npc_store = self.npc_grid, self.npc_store
+        for npc, tile, alive in zip(self.npc_list, npc_store.get_tiles(), npc_store.alive[:npc_store.count].tolist()):
+            if alive:
+                npc_grid.move(npc, tile)
+            elif npc in npc_grid:
+                npc_grid.remove(npc)
+        # path finding treats a new npc_positions set as changed occupancy
+        if npc_grid.version != self.npc_positions_version:
+            self.npc_positions_version = npc_grid.version
+            self.npc_positions = set(npc_grid.cells)
+
+    def get_npcs_in_radius(self, x, y, radius):
+        return self.npc_grid.query_radius(x, y, radius)
+
+    def is_npc_at(self, tile):
+        return self.npc_grid.is_occupied(tile)
+
+    def get_alive_count(self):
+        return len(self.npc_grid)
+
+    def project_sprites(self, draw=True):
+        """
+        Vectorized SpriteObject.get_sprite for every sprite and NPC, projecting only the visible
+        ones. Without draw, only the NPC projection that their logic reads is worked out.
+        """
+        player, npc_store = self.game.player, self.npc_store
+        if self.entities_changed:
+            self.index_entities()
+        num_sprites = len(self.sprite_list)
+        self.entity_x[num_sprites:] = npc_store.x[:npc_store.count]
+        self.entity_y[num_sprites:] = npc_store.y[:npc_store.count]
+
+        dx = self.entity_x - player.x
+        dy = self.entity_y - player.y
+        theta = np.arctan2(dy, dx)
+
+        delta = theta - player.angle
+        delta[((dx > 0) & (player.angle > math.pi)) | ((dx < 0) & (dy < 0))] += math.tau
+
+        screen_x = (HALF_NUM_RAYS + delta / DELTA_ANGLE) * SCALE
+        dist = np.hypot(dx, dy)
+        norm_dist = dist * np.cos(delta)
+        visible = ((-self.entity_half_width < screen_x) & (screen_x < WIDTH + self.entity_half_width) &
+                   (norm_dist > 0.5))
+
+        # NPC logic reads the projection of every NPC from the store, other sprites only need it when drawn
+        npcs = slice(num_sprites, None)
+        npc_store.theta[:npc_store.count], npc_store.screen_x[:npc_store.count] = theta[npcs], screen_x[npcs]
+        npc_store.dist[:npc_store.count], npc_store.norm_dist[:npc_store.count] = dist[npcs], norm_dist[npcs]
+        if not draw:
+            # the width get_sprite_projection would give, which aiming checks against
+            in_view = np.flatnonzero(visible[npcs])
+            proj = SCREEN_DIST / norm_dist[npcs][in_view] * self.entity_scale[npcs][in_view]
+            proj = np.maximum(1, np.round(proj / SPRITE_CACHE_HEIGHT_STEP) * SPRITE_CACHE_HEIGHT_STEP)
+            npc_store.sprite_half_width[in_view] = proj * self.entity_ratio[npcs][in_view] // 2
+            return
+
+        candidates = np.flatnonzero(visible)
+        visible[candidates] = self.get_unoccluded(candidates, screen_x, norm_dist)
+
+        updated = np.flatnonzero(visible[:num_sprites]).tolist()
+        values = zip(dx[updated].tolist(), dy[updated].tolist(), theta[updated].tolist(),
+                     screen_x[updated].tolist(), dist[updated].tolist(), norm_dist[updated].tolist())
+        for index, (sprite_dx, sprite_dy, sprite_theta, sprite_screen_x, sprite_dist, sprite_norm_dist) in zip(updated, values):
+            sprite = self.entities[index]
+            sprite.dx, sprite.dy, sprite.theta = sprite_dx, sprite_dy, sprite_theta
+            sprite.screen_x, sprite.dist, sprite.norm_dist = sprite_screen_x, sprite_dist, sprite_norm_dist
+            sprite.get_sprite_projection()
+        for index in np.flatnonzero(visible[npcs]).tolist():
+            self.npc_list[index].get_sprite_projection()
+
+    def get_unoccluded(self, indices, screen_x, norm_dist):
+        """
+        Mask of the entities some column of whose projection is in front of the walls, so the
+        ones hidden behind walls skip projection. Each check is a range maximum of the depth
+        buffer over the projection's columns, from a table of maxima over power of two spans.
+        """
+        depth_levels = [self.game.raycasting.depth_buffer]
+        while 1 << len(depth_levels) <= NUM_RAYS:
+            depth = depth_levels[-1]
+            span = 1 << (len(depth_levels) - 1)
+            depth_levels.append(np.maximum(depth, np.concatenate((depth[span:], np.full(span, -np.inf)))))
+        depth_levels = np.array(depth_levels)
+
+        # a little wider than the projection, which rounds its height up to the cache step
+        norm_dist = norm_dist[indices]
+        proj = SCREEN_DIST / norm_dist * self.entity_scale[indices] + SPRITE_CACHE_HEIGHT_STEP
+        half_width = proj * self.entity_ratio[indices] / 2 + SCALE
+        first_ray = ((screen_x[indices] - half_width) // SCALE).clip(0, NUM_RAYS - 1).astype(np.int64)
+        last_ray = ((screen_x[indices] + half_width) // SCALE).clip(0, NUM_RAYS - 1).astype(np.int64)
+        level = np.log2(last_ray - first_ray + 1).astype(np.int64)
+        deepest = np.maximum(depth_levels[level, first_ray], depth_levels[level, last_ray - (1 << level) + 1])
+        return deepest > norm_dist
 
     def add_npc(self, npc):
-        self.npc_list.append(npc)
+        """Index an NPC, which is already in npc_list since it was created in this handler's store"""
+        if npc.alive:
+            self.npc_grid.add(npc)
+        self.entities_changed = True
 
     def add_sprite(self, sprite):
-        self.sprite_list.append(sprite)
\ No newline at end of file
+        self.sprite_list.append(sprite)
+        self.entities_changed = True
+
+    def index_entities(self):
+        self.entities_changed = False
+        self.entities = self.sprite_list + self.npc_list
+        self.entity_x = np.array([entity.x for entity in self.entities], dtype=float)
+        self.entity_y = np.array([entity.y for entity in self.entities], dtype=float)
+        self.entity_half_width = np.array([entity.IMAGE_HALF_WIDTH for entity in self.entities], dtype=float)
+        self.entity_scale = np.array([entity.SPRITE_SCALE for entity in self.entities], dtype=float)
+        self.entity_ratio = np.array([entity.IMAGE_RATIO for entity in self.entities], dtype=float)
\ No newline at end of file
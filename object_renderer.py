@@ -1,6 +1,8 @@
 import pygame as pg
 import math
 from settings import *
+from hud import Hud
+from assets import assets
 
 class ObjectRenderer:
     """
@@ -14,7 +16,6 @@ class ObjectRenderer:
         # Load textures and images
         self.wall_textures = self.load_wall_textures()
         self.sky_image = self.get_texture('resources/textures/wide_sky.png', (WIDTH, HALF_HEIGHT))
-        self.sky_offset = 0
         self.blood_screen = self.get_texture('resources/textures/blood_screen.png', RES)
         
         # Load UI elements
@@ -28,70 +29,99 @@ class ObjectRenderer:
         # Initialize fonts and UI settings
         self.font = pg.font.Font(None, 72)
         self.small_font = pg.font.Font(None, 36)
-        self.explored_areas = set()  # Track explored areas for fog of war
+
+        # Cached HUD layers, re-rendered only when their inputs change
+        self.crosshair_size = 50
+        self.hud = Hud(self.screen)
+        self.hud.add_layer('floor', self.render_floor)
+        self.hud.add_layer('crosshair', self.render_crosshair)
+        self.hud.add_layer('health', self.render_player_health)
+        self.hud.add_layer('game_over', lambda: self.render_end_screen(self.game_over_image, 'Press R to Restart'),
+                           static=True)
+        self.hud.add_layer('victory', lambda: self.render_end_screen(self.victory_image, 'Press R to Play Again'),
+                           static=True)
+
+        # Minimap layer with fog of war, redrawn only when the player changes tile
+        self.minimap_size = 200
+        self.minimap_tile_size = 10
+        self.minimap_radius = 10
+        self.minimap_view = self.get_minimap_view(self.minimap_radius)
         
         # Visual effect settings
-        self.damage_alpha = 0
         self.damage_fade_speed = DAMAGE_FADE_SPEED
-        self.flash_alpha = 0
         self.flash_fade_speed = 10
+        self.reset()
+
+    def reset(self):
+        """Clears the effects and the fog of war of a game session, keeping the textures and HUD layers"""
+        self.sky_offset = 0
+        self.damage_alpha = 0
+        self.flash_alpha = 0
+        self.reset_minimap()
+        # static layers such as the end screens are blitted again, not taken as still on screen
+        self.hud.invalidate()
+
+    def update(self):
+        """Advance effects that follow game time, once per simulation step"""
+        # Parallax sky effect
+        self.sky_offset = (self.sky_offset + 4.0 * self.game.player.rel) % WIDTH
 
     def draw(self):
         """Main drawing method that renders all game elements"""
+        profiler = self.game.profiler
         self.draw_background()
+        profiler.lap('background')
         self.render_game_objects()
         self.draw_player_health()
+        profiler.lap('hud')
         self.draw_minimap()
+        profiler.lap('minimap')
         self.draw_crosshair()
         self.draw_damage_effect()
         self.draw_weapon_flash()
 
     def draw_background(self):
         """Renders the sky and floor"""
-        # Parallax sky effect
-        self.sky_offset = (self.sky_offset + 4.0 * self.game.player.rel) % WIDTH
         self.screen.blit(self.sky_image, (-self.sky_offset, 0))
         self.screen.blit(self.sky_image, (-self.sky_offset + WIDTH, 0))
         
         # Floor with gradient
+        self.hud.draw('floor', (0, HALF_HEIGHT))
+
+    @staticmethod
+    def render_floor():
+        """Renders the floor gradient once, it never changes"""
         floor_surface = pg.Surface((WIDTH, HALF_HEIGHT))
         for y in range(HALF_HEIGHT):
             darkness = 1 - (y / HALF_HEIGHT) * 0.5
             color = tuple(int(c * darkness) for c in FLOOR_COLOR)
             pg.draw.line(floor_surface, color, (0, y), (WIDTH, y))
-        self.screen.blit(floor_surface, (0, HALF_HEIGHT))
+        return floor_surface
 
     def draw_crosshair(self):
         """Draws an animated crosshair"""
-        cross_size = 20
-        center_x, center_y = HALF_WIDTH, HALF_HEIGHT
-        
         # Dynamic crosshair color based on whether player is aiming at an enemy
         color = (255, 0, 0) if self.game.player.is_targeting_enemy() else (255, 255, 255)
         
-        # Draw crosshair lines with slight animation
-        offset = math.sin(pg.time.get_ticks() * 0.005) * 2
-        pg.draw.line(self.screen, color, (center_x - cross_size - offset, center_y),
-                    (center_x + cross_size + offset, center_y), 2)
-        pg.draw.line(self.screen, color, (center_x, center_y - cross_size - offset),
-                    (center_x, center_y + cross_size + offset), 2)
+        # Slight animation, in whole pixels so the cached crosshair is reused between steps
+        offset = round(math.sin(pg.time.get_ticks() * 0.005) * 2)
+        size = self.crosshair_size
+        self.hud.draw('crosshair', (HALF_WIDTH - size // 2, HALF_HEIGHT - size // 2), color, offset)
+
+    def render_crosshair(self, color, offset):
+        cross_size = 20
+        crosshair = pg.Surface((self.crosshair_size, self.crosshair_size), pg.SRCALPHA)
+        center = self.crosshair_size // 2
+        pg.draw.line(crosshair, color, (center - cross_size - offset, center),
+                    (center + cross_size + offset, center), 2)
+        pg.draw.line(crosshair, color, (center, center - cross_size - offset),
+                    (center, center + cross_size + offset), 2)
+        return crosshair
 
     def draw_player_health(self):
         """Renders player health bar with dynamic colors and effects"""
-        # Health bar background
-        health_bar_width = 200
-        health_bar_height = 30
-        health_bar_x = 20
-        health_bar_y = HEIGHT - 50
-        
-        # Draw background
-        pg.draw.rect(self.screen, (40, 40, 40), 
-                    (health_bar_x - 2, health_bar_y - 2, 
-                     health_bar_width + 4, health_bar_height + 4))
-        
         # Calculate health ratio and color
         health_ratio = self.game.player.health / PLAYER_MAX_HEALTH
-        current_width = health_ratio * health_bar_width
         
         # Dynamic health bar color
         if health_ratio > 0.7:
@@ -105,17 +135,37 @@ class ObjectRenderer:
         if health_ratio < 0.3:
             pulse = abs(math.sin(pg.time.get_ticks() * 0.005))
             health_color = tuple(int(c * (0.7 + 0.3 * pulse)) for c in health_color)
+
+        # The layer starts at the top left of the digits, above the bar
+        self.hud.draw('health', (18, HEIGHT - 80), self.game.player.health, health_color)
+
+    def render_player_health(self, health, health_color):
+        """Renders the health bar frame, bar and digits into one layer"""
+        health_bar_width = 200
+        health_bar_height = 30
+        health_bar_x = 2
+        health_bar_y = 30
+        health_text = f"{health}/{PLAYER_MAX_HEALTH}"
+
+        layer_width = max(health_bar_width + 4, health_bar_x + (len(health_text) - 1) * 25 + self.digit_size)
+        layer = pg.Surface((layer_width, self.digit_size), pg.SRCALPHA)
+
+        # Draw background
+        pg.draw.rect(layer, (40, 40, 40), 
+                    (health_bar_x - 2, health_bar_y - 2, 
+                     health_bar_width + 4, health_bar_height + 4))
         
         # Draw health bar
-        pg.draw.rect(self.screen, health_color, 
+        current_width = health / PLAYER_MAX_HEALTH * health_bar_width
+        pg.draw.rect(layer, health_color, 
                     (health_bar_x, health_bar_y, current_width, health_bar_height))
         
         # Draw health text
-        health_text = f"{self.game.player.health}/{PLAYER_MAX_HEALTH}"
         for i, char in enumerate(health_text):
             if char == '/':
                 char = '10'
-            self.screen.blit(self.digits[char], (health_bar_x + i * 25, health_bar_y - 30))
+            layer.blit(self.digits[char], (health_bar_x + i * 25, health_bar_y - 30))
+        return layer
 
     def draw_damage_effect(self):
         """Renders blood screen effect when player takes damage"""
@@ -135,62 +185,64 @@ class ObjectRenderer:
             self.screen.blit(flash_surface, (0, 0))
             self.flash_alpha = max(0, self.flash_alpha - self.flash_fade_speed)
 
+    @staticmethod
+    def get_minimap_view(radius):
+        """Tile offsets within radius of the centre of the player's tile"""
+        return [(dx, dy) for dy in range(-radius - 1, radius + 2) for dx in range(-radius - 1, radius + 2)
+                if (dx - 0.5) ** 2 + (dy - 0.5) ** 2 <= radius ** 2]
+
+    def reset_minimap(self):
+        """Clears the baked minimap layer, whose pixels keep the fog of war of the explored tiles"""
+        self.visible_tiles = []
+        self.minimap_map_pos = None
+
+        self.minimap_layer = pg.Surface((self.minimap_size, self.minimap_size), pg.SRCALPHA)
+        pg.draw.rect(self.minimap_layer, (0, 0, 0, 180), (0, 0, self.minimap_size, self.minimap_size))
+        pg.draw.rect(self.minimap_layer, (100, 100, 100, 255), (0, 0, self.minimap_size, self.minimap_size), 2)
+
+    def update_minimap(self):
+        """Moves the visible area of the baked minimap layer when the player enters a new tile"""
+        map_pos = self.game.player.map_pos
+        if map_pos == self.minimap_map_pos:
+            return
+        self.minimap_map_pos = map_pos
+        game_map = self.game.map
+        tile_size = self.minimap_tile_size
+
+        # Tiles that were in view fall back to the explored fog of war colors
+        for x, y in self.visible_tiles:
+            color = (80, 80, 80, 150) if game_map.is_wall(x, y) else (40, 40, 40, 150)
+            pg.draw.rect(self.minimap_layer, color, (x * tile_size, y * tile_size, tile_size - 1, tile_size - 1))
+
+        px, py = map_pos
+        self.visible_tiles = [(px + dx, py + dy) for dx, dy in self.minimap_view
+                              if 0 <= px + dx < game_map.cols and 0 <= py + dy < game_map.rows]
+        for x, y in self.visible_tiles:
+            color = (200, 200, 200, 255) if game_map.is_wall(x, y) else (60, 60, 60, 255)
+            pg.draw.rect(self.minimap_layer, color, (x * tile_size, y * tile_size, tile_size - 1, tile_size - 1))
+
     def draw_minimap(self):
         """Renders an enhanced minimap with fog of war and enemy indicators"""
-        map_size = 200
-        tile_size = 10
-        map_pos = (WIDTH - map_size - 20, 20)
-        radius = 10
-
-        # Create minimap surface with transparency
-        minimap_surf = pg.Surface((map_size, map_size), pg.SRCALPHA)
-        
-        # Draw background
-        pg.draw.rect(minimap_surf, (0, 0, 0, 180), (0, 0, map_size, map_size))
-        pg.draw.rect(minimap_surf, (100, 100, 100, 255), (0, 0, map_size, map_size), 2)
+        tile_size = self.minimap_tile_size
+        map_pos = (WIDTH - self.minimap_size - 20, 20)
+        radius = self.minimap_radius
 
+        # Composite dynamic markers over a copy of the baked layer
+        self.update_minimap()
+        minimap_surf = self.minimap_layer.copy()
         px, py = self.game.player.x, self.game.player.y
 
-        # Update explored areas
-        for y, row in enumerate(self.game.map.mini_map):
-            for x, col in enumerate(row):
-                if (x - px) ** 2 + (y - py) ** 2 <= radius ** 2:
-                    self.explored_areas.add((x, y))
-
-        # Draw explored areas with fog of war effect
-        for x, y in self.explored_areas:
-            map_x = x * tile_size
-            map_y = y * tile_size
-            if (x, y) in self.game.map.world_map:
-                color = (80, 80, 80, 150)
-            else:
-                color = (40, 40, 40, 150)
-            pg.draw.rect(minimap_surf, color, (map_x, map_y, tile_size - 1, tile_size - 1))
-
-        # Draw visible areas
-        for y, row in enumerate(self.game.map.mini_map):
-            for x, col in enumerate(row):
-                if (x - px) ** 2 + (y - py) ** 2 <= radius ** 2:
-                    map_x = x * tile_size
-                    map_y = y * tile_size
-                    if col:
-                        color = (200, 200, 200, 255)
-                    else:
-                        color = (60, 60, 60, 255)
-                    pg.draw.rect(minimap_surf, color, (map_x, map_y, tile_size - 1, tile_size - 1))
-
         # Draw NPCs with threat indicators
-        for npc in self.game.object_handler.npc_list:
-            if npc.alive and (npc.x - px) ** 2 + (npc.y - py) ** 2 <= radius ** 2:
-                map_x = int(npc.x * tile_size)
-                map_y = int(npc.y * tile_size)
-                # Pulsing effect for enemies
-                pulse = abs(math.sin(pg.time.get_ticks() * 0.005))
-                enemy_color = (255, 0, 0, 255)
-                pg.draw.circle(minimap_surf, enemy_color, (map_x, map_y), 3)
-                # Threat radius
-                pg.draw.circle(minimap_surf, (255, 0, 0, 50), (map_x, map_y), 
-                             int(5 + 2 * pulse))
+        for npc in self.game.object_handler.get_npcs_in_radius(px, py, radius):
+            map_x = int(npc.x * tile_size)
+            map_y = int(npc.y * tile_size)
+            # Pulsing effect for enemies
+            pulse = abs(math.sin(pg.time.get_ticks() * 0.005))
+            enemy_color = (255, 0, 0, 255)
+            pg.draw.circle(minimap_surf, enemy_color, (map_x, map_y), 3)
+            # Threat radius
+            pg.draw.circle(minimap_surf, (255, 0, 0, 50), (map_x, map_y), 
+                         int(5 + 2 * pulse))
 
         # Draw player with direction indicator
         map_x = int(px * tile_size)
@@ -208,17 +260,18 @@ class ObjectRenderer:
 
     def game_over(self):
         """Displays game over screen with stats"""
-        self.screen.blit(self.game_over_image, (0, 0))
-        restart_text = self.font.render('Press R to Restart', True, (255, 255, 255))
-        text_rect = restart_text.get_rect(center=(WIDTH / 2, HEIGHT - 100))
-        self.screen.blit(restart_text, text_rect)
+        self.hud.draw('game_over', (0, 0))
 
     def victory(self):
         """Displays victory screen with stats"""
-        self.screen.blit(self.victory_image, (0, 0))
-        restart_text = self.font.render('Press R to Play Again', True, (255, 255, 255))
+        self.hud.draw('victory', (0, 0))
+
+    def render_end_screen(self, image, text):
+        end_screen = image.copy()
+        restart_text = self.font.render(text, True, (255, 255, 255))
         text_rect = restart_text.get_rect(center=(WIDTH / 2, HEIGHT - 100))
-        self.screen.blit(restart_text, text_rect)
+        end_screen.blit(restart_text, text_rect)
+        return end_screen
 
     def player_damage(self):
         """Triggers damage effect when player is hit"""
@@ -230,9 +283,8 @@ class ObjectRenderer:
 
     @staticmethod
     def get_texture(path, res=(TEXTURE_SIZE, TEXTURE_SIZE)):
-        """Loads and scales a texture from file"""
-        texture = pg.image.load(path).convert_alpha()
-        return pg.transform.scale(texture, res)
+        """Loads and scales a texture from file, shared with every other use of the same path and size"""
+        return assets.get_image(path, tuple(res))
 
     def load_wall_textures(self):
         """Loads wall textures with variations"""
@@ -245,8 +297,14 @@ class ObjectRenderer:
         }
 
     def render_game_objects(self):
-        """Renders all game objects with depth sorting"""
-        list_objects = sorted(self.game.raycasting.objects_to_render, 
-                            key=lambda t: t[0], reverse=True)
-        for depth, image, pos in list_objects:
-            self.screen.blit(image, pos)
\ No newline at end of file
+        """Renders walls, then sprites from far to near clipped against the wall depth buffer"""
+        raycasting = self.game.raycasting
+        if raycasting.frame_buffer:
+            raycasting.frame_buffer.draw()
+        else:
+            self.screen.blits(raycasting.walls_to_render, doreturn=False)
+        self.game.profiler.lap('walls')
+
+        list_objects = sorted(raycasting.objects_to_render, key=lambda t: t[0], reverse=True)
+        self.screen.blits([(image, pos, area) for depth, image, pos, area in list_objects], doreturn=False)
+        self.game.profiler.lap('sprites')
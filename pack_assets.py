@@ -0,0 +1,89 @@
+"""
+Packs every PNG under the ASSET_PACK_ROOTS folders into atlas pages of raw BGRA pixels in
+ASSET_PACK, which the game memory-maps instead of decoding the PNGs. Run again after changing
+an image; frames whose file changed since packing are decoded from the PNG until then.
+Run with: python pack_assets.py
+"""
+import argparse
+import json
+import os
+import struct
+import time
+
+import numpy as np
+import pygame as pg
+
+from assets import PACK_MAGIC, align, find_files
+from settings import ASSET_PACK, ASSET_PACK_ROOTS, ASSET_PACK_PAGE_SIZE
+
+
+def place_images(sizes, page_size):
+    """Shelf packing, tallest first: (page, x, y) per size and the used height of each page"""
+    placements = [None] * len(sizes)
+    page_heights = [0]
+    x = shelf_y = shelf_height = 0
+    for index in sorted(range(len(sizes)), key=lambda index: (-sizes[index][1], -sizes[index][0])):
+        width, height = sizes[index]
+        if width > page_size or height > page_size:
+            raise ValueError(f'{width}x{height} image does not fit a {page_size} pixel page')
+        if x + width > page_size:
+            x, shelf_y, shelf_height = 0, shelf_y + shelf_height, 0
+        if shelf_y + height > page_size:
+            page_heights.append(0)
+            x = shelf_y = shelf_height = 0
+        placements[index] = len(page_heights) - 1, x, shelf_y
+        x += width
+        shelf_height = max(shelf_height, height)
+        page_heights[-1] = max(page_heights[-1], shelf_y + height)
+    return placements, page_heights
+
+
+def write_pack(path, image_paths, page_size):
+    # converted like the game converts them, so packed pixels match decoded ones exactly
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    pg.display.init()
+    pg.display.set_mode((1, 1))
+    images = [pg.image.load(image_path).convert_alpha() for image_path in image_paths]
+    sizes = [image.get_size() for image in images]
+    placements, page_heights = place_images(sizes, page_size)
+
+    pages = [np.zeros((height, page_size, 4), dtype=np.uint8) for height in page_heights]
+    folders = {}
+    for image_path, image, (width, height), (page_id, x, y) in zip(image_paths, images, sizes, placements):
+        pixels = np.frombuffer(pg.image.tobytes(image, 'BGRA'), dtype=np.uint8).reshape(height, width, 4)
+        pages[page_id][y:y + height, x:x + width] = pixels
+        stat = os.stat(image_path)
+        folder, file_name = image_path.rsplit('/', 1)
+        folders.setdefault(folder, {})[file_name] = [page_id, x, y, width, height, stat.st_mtime_ns, stat.st_size]
+
+    # page offsets are from the first aligned byte after the index
+    page_entries, offset = [], 0
+    for page in pages:
+        page_entries.append([offset, page_size, len(page)])
+        offset = align(offset + page.nbytes)
+    index = json.dumps({'format': 'BGRA', 'pages': page_entries, 'folders': folders}).encode()
+
+    with open(path, 'wb') as file:
+        file.write(PACK_MAGIC + struct.pack('<I', len(index)) + index)
+        data_start = align(file.tell())
+        for page, (page_offset, _, _) in zip(pages, page_entries):
+            file.seek(data_start + page_offset)
+            file.write(page.tobytes())
+    return len(images), len(pages), os.path.getsize(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--output', default=ASSET_PACK)
+    parser.add_argument('--page-size', type=int, default=ASSET_PACK_PAGE_SIZE)
+    parser.add_argument('roots', nargs='*', default=ASSET_PACK_ROOTS, help='folders whose PNGs are packed')
+    args = parser.parse_args()
+
+    time_start = time.perf_counter()
+    images, pages, size = write_pack(args.output, find_files(args.roots, '.png'), args.page_size)
+    print(f'packed {images} images into {pages} pages, {size / 2 ** 20:.1f} MB in {args.output}'
+          f' ({time.perf_counter() - time_start:.1f} s)')
+
+
+if __name__ == '__main__':
+    main()
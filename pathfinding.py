@@ -1,17 +1,75 @@
 from collections import deque
+import time
+import numpy as np
+from array import array
+from heapq import heappush, heappop
+from settings import *
+from hierarchical_pathfinding import HierarchicalPathFinding
 
 
 class PathFinding:
+    """
+    Path queries over the 8-way grid of floor tiles. Neighbours are read from the map's tiles as
+    a search reaches them, so nothing here covers the whole level except the A* buffers, which
+    only the astar and hierarchical modes make.
+    """
     def __init__(self, game):
         self.game = game
-        self.map = game.map.mini_map
         self.ways = [-1, 0], [0, -1], [1, 0], [0, 1], [-1, -1], [1, -1], [1, 1], [-1, 1]
-        self.graph = {}
-        self.get_graph()
+        self.rows, self.cols = game.map.rows, game.map.cols
+
+        # Flow field rooted at the player's tile, shared by every NPC, over the tiles within
+        # PATHFINDING_FLOW_RADIUS of it
+        self.flow_rect = 0, 0, 0, 0  # tiles it covers, x0, y0, x1, y1
+        self.flow_next = []  # next tile towards the goal, row by row over flow_rect
+        self.flow_dist = []  # steps to the goal, -1 if unreachable
+        self.flow_goal = None
+        self.flow_blocked = set()
+        self.flow_checked = None
+        self.flow_build = None  # field being built a slice per query, swapped in when done
+
+        # A* search buffers indexed by tile id (y * cols + x), reused by every query, made by the first
+        self.steps = None
+        self.g_cost = self.parent = self.opened = self.closed = None
+        self.search_id = 0
+        self.blocked_positions = None
+        self.blocked_ids = set()
+        self.expanded = 0  # nodes expanded by the last BFS or A* query
+
+        # Cluster abstraction for large maps, built a slice per frame from the start in hierarchical mode
+        self.hierarchy = None
+        self.hierarchy_build = None  # the hierarchy's build generator until it is done
+        if PATHFINDING_MODE == 'hierarchical':
+            self.start_hierarchy()
+
+    def reset(self):
+        """Drop the flow field of the last game session, keeping any search buffers of the map"""
+        self.flow_goal = self.flow_checked = self.flow_build = None
+        self.flow_rect, self.flow_next, self.flow_dist = (0, 0, 0, 0), [], []
+        self.flow_blocked = set()
 
     def get_path(self, start, goal):
+        if PATHFINDING_MODE == 'flow_field':
+            return self.get_flow_path(start, goal)
+        if PATHFINDING_MODE == 'astar':
+            return self.get_astar_path(start, goal)
+        if PATHFINDING_MODE == 'hierarchical':
+            return self.get_hierarchical_path(start, goal)
+        return self.get_bfs_path(start, goal)
+
+    def get_paths(self, starts, goal):
+        """get_path for many start tiles, reading the flow field directly when it is in use"""
+        if PATHFINDING_MODE != 'flow_field':
+            return [self.get_path(start, goal) for start in starts]
+        self.update_flow_field(goal)
+        (x0, y0, x1, y1), flow_next = self.flow_rect, self.flow_next
+        cols = x1 - x0
+        paths = [flow_next[(y - y0) * cols + x - x0] if x0 <= x < x1 and y0 <= y < y1 else None for x, y in starts]
+        return [goal if step is None else step for step in paths]
+
+    def get_bfs_path(self, start, goal):
         try:
-            self.visited = self.bfs(start, goal, self.graph)
+            self.visited = self.bfs(start, goal)
             path = [goal]
             step = self.visited.get(goal, start)
 
@@ -22,30 +80,246 @@ class PathFinding:
         except (KeyError, IndexError):
             return start
 
-    def bfs(self, start, goal, graph):
-        queue = deque([start])
+    def get_flow_path(self, start, goal):
+        self.update_flow_field(goal)
+        x, y = start
+        x0, y0, x1, y1 = self.flow_rect
+        if start == goal or not (x0 <= x < x1 and y0 <= y < y1):
+            return goal
+        step = self.flow_next[(y - y0) * (x1 - x0) + x - x0]
+        # like the BFS path, an unreachable goal, or one beyond the field, is headed for directly
+        return step if step is not None else goal
+
+    def update(self):
+        """Carry on flow field and cluster builds that did not finish within their budget, once per frame"""
+        if self.flow_build is not None:
+            self.advance_flow_build()
+        if self.hierarchy_build is not None:
+            self.advance_hierarchy_build()
+
+    def update_flow_field(self, goal):
+        """
+        Rebuild the flow field when the goal tile or the NPC occupancy changed. On large maps a
+        build can outlast PATHFINDING_FLOW_BUDGET, so update finishes it over the next frames
+        while the last finished field stays in use, and the next change is picked up after it.
+        """
+        if self.flow_build is not None:
+            return
+        npc_positions = self.game.object_handler.npc_positions
+        if goal == self.flow_goal and (npc_positions is self.flow_checked or npc_positions == self.flow_blocked):
+            self.flow_checked = npc_positions
+            return
+        self.flow_checked = npc_positions
+        self.flow_build = self.build_flow_field(goal, set(npc_positions))
+        self.advance_flow_build()
+
+    def advance_flow_build(self):
+        # the first field is needed whole
+        budget = PATHFINDING_FLOW_BUDGET if self.flow_goal is not None else float('inf')
+        time_start = time.perf_counter()
+        for _ in self.flow_build:
+            if (time.perf_counter() - time_start) * 1000 > budget:
+                return
+        self.flow_build = None
+
+    def build_flow_field(self, goal, blocked):
+        """
+        Breadth-first search outwards from the goal over the tiles within PATHFINDING_FLOW_RADIUS
+        of it, recording each tile's step back towards it. A generator that pauses every few
+        hundred tiles and swaps the field in when it is done.
+        """
+        # the field covers a ring of tiles around those within reach, taken as walls so steps need no bounds checks
+        radius = PATHFINDING_FLOW_RADIUS
+        x0, y0 = max(0, goal[0] - radius) - 1, max(0, goal[1] - radius) - 1
+        x1, y1 = min(self.cols, goal[0] + radius + 1) + 1, min(self.rows, goal[1] + radius + 1) + 1
+        cols = x1 - x0
+        walls = self.get_walls(x0, y0, x1, y1)
+        offsets = [dy * cols + dx for dx, dy in self.ways]
+        blocked_ids = {(y - y0) * cols + x - x0 for x, y in blocked if x0 <= x < x1 and y0 <= y < y1}
+
+        flow_next = [None] * len(walls)
+        flow_dist = [-1] * len(walls)
+        goal_id = (goal[1] - y0) * cols + goal[0] - x0
+        flow_next[goal_id] = goal
+        flow_dist[goal_id] = 0
+        queue = deque([goal_id])
+        expanded = 0
+
+        while queue:
+            cur_id = queue.popleft()
+            cur_y, cur_x = divmod(cur_id, cols)
+            cur_node = x0 + cur_x, y0 + cur_y
+            dist = flow_dist[cur_id] + 1
+            for offset in offsets:
+                next_id = cur_id + offset
+                if flow_next[next_id] is None and not walls[next_id]:
+                    flow_next[next_id] = cur_node
+                    flow_dist[next_id] = dist
+                    # occupied tiles can be reached by their own NPC but not walked through
+                    if next_id not in blocked_ids:
+                        queue.append(next_id)
+            expanded += 1
+            if not expanded % 256:
+                yield
+
+        self.flow_rect, self.flow_next, self.flow_dist = (x0, y0, x1, y1), flow_next, flow_dist
+        self.flow_goal, self.flow_blocked = goal, blocked
+
+    def get_astar_path(self, start, goal):
+        """
+        A* over the 8-way graph with diagonal steps costing sqrt(2) and an octile heuristic.
+        Stops after PATHFINDING_MAX_EXPANSIONS nodes and heads for the node closest to the goal.
+        """
+        cols, rows = self.cols, self.rows
+        if start == goal or not self.is_floor(start) or not self.is_floor(goal):
+            return goal
+        if self.g_cost is None:
+            self.make_search_buffers()
+        start_id, goal_id = start[1] * cols + start[0], goal[1] * cols + goal[0]
+        goal_x, goal_y = goal
+        blocked = self.get_blocked_ids()
+        is_wall, steps = self.game.map.is_wall, self.steps
+        g_cost, parent, opened, closed = self.g_cost, self.parent, self.opened, self.closed
+        self.search_id += 1
+        search_id = self.search_id
+
+        g_cost[start_id] = 0.0
+        parent[start_id] = -1
+        opened[start_id] = search_id
+        best_id, best_h = start_id, self.octile(start[0] - goal_x, start[1] - goal_y)
+        open_heap = [(best_h, start_id)]
+        expanded = 0
+
+        while open_heap:
+            cur_id = heappop(open_heap)[1]
+            if closed[cur_id] == search_id:
+                continue
+            if cur_id == goal_id:
+                best_id = goal_id
+                break
+            if expanded == PATHFINDING_MAX_EXPANSIONS:
+                break
+            closed[cur_id] = search_id
+            expanded += 1
+            cur_g = g_cost[cur_id]
+            cur_y, cur_x = divmod(cur_id, cols)
+            for dx, dy, offset, cost in steps:
+                next_x, next_y, next_id = cur_x + dx, cur_y + dy, cur_id + offset
+                if (not (0 <= next_x < cols and 0 <= next_y < rows) or closed[next_id] == search_id
+                        or next_id in blocked or is_wall(next_x, next_y)):
+                    continue
+                next_g = cur_g + cost
+                if opened[next_id] != search_id or next_g < g_cost[next_id]:
+                    opened[next_id] = search_id
+                    g_cost[next_id] = next_g
+                    parent[next_id] = cur_id
+                    h = self.octile(next_x - goal_x, next_y - goal_y)
+                    if h < best_h:
+                        best_id, best_h = next_id, h
+                    heappush(open_heap, (next_g + h, next_id))
+        else:
+            # like the BFS path, an unreachable goal is headed for directly
+            self.expanded = expanded
+            return goal
+        self.expanded = expanded
+
+        step = best_id
+        while step != start_id and parent[step] != start_id:
+            step = parent[step]
+        return step % cols, step // cols
+
+    def make_search_buffers(self):
+        """A* buffers for every tile, left out in the other modes until a query needs them"""
+        size = self.rows * self.cols
+        # the ways as (dx, dy, tile id offset, step cost)
+        self.steps = [(dx, dy, dy * self.cols + dx, SQRT_2 if dx and dy else 1.0) for dx, dy in self.ways]
+        self.g_cost = array('d', bytes(8 * size))
+        self.parent = array('i', bytes(4 * size))
+        self.opened = array('I', bytes(4 * size))  # id of the last search that reached the tile
+        self.closed = array('I', bytes(4 * size))  # id of the last search that expanded the tile
+
+    def start_hierarchy(self):
+        self.hierarchy = HierarchicalPathFinding(self)
+        self.hierarchy_build = self.hierarchy.build()
+
+    def advance_hierarchy_build(self):
+        time_start = time.perf_counter()
+        for _ in self.hierarchy_build:
+            if (time.perf_counter() - time_start) * 1000 > PATHFINDING_CLUSTER_BUDGET:
+                return
+        self.hierarchy_build = None
+
+    def build_hierarchy(self):
+        """Build the whole cluster abstraction now, rather than a slice per frame"""
+        if self.hierarchy is None:
+            self.start_hierarchy()
+        if self.hierarchy_build is not None:
+            for _ in self.hierarchy_build:
+                pass
+            self.hierarchy_build = None
+
+    def get_hierarchical_path(self, start, goal):
+        """
+        Cluster-level search that refines only the first leg, falling back to A* nearby. Until
+        update has finished building the clusters every query is answered by A*.
+        """
+        if start == goal or not self.is_floor(start) or not self.is_floor(goal):
+            return goal
+        if self.hierarchy is None:
+            self.start_hierarchy()
+        if self.hierarchy_build is not None or self.hierarchy.get_cluster(start) == self.hierarchy.get_cluster(goal):
+            return self.get_astar_path(start, goal)
+
+        step = self.hierarchy.get_path(start, goal, self.game.object_handler.npc_positions)
+        self.expanded = self.hierarchy.expanded
+        # clusters only joined diagonally or blocked by NPCs, and cut off first legs, are left to the flat search
+        return step if step is not None else self.get_astar_path(start, goal)
+
+    @staticmethod
+    def octile(dx, dy):
+        dx, dy = abs(dx), abs(dy)
+        return dx + dy + (SQRT_2 - 2) * min(dx, dy)
+
+    def get_blocked_ids(self):
+        """Tile ids occupied by NPCs, rebuilt once per new npc_positions set"""
+        npc_positions = self.game.object_handler.npc_positions
+        if npc_positions is not self.blocked_positions:
+            self.blocked_positions = npc_positions
+            self.blocked_ids = {y * self.cols + x for x, y in npc_positions}
+        return self.blocked_ids
+
+    def bfs(self, start, goal):
+        queue = deque([start] if self.is_floor(start) else [])
         visited = {start: None}
+        self.expanded = 0
 
         while queue:
             cur_node = queue.popleft()
+            self.expanded += 1
             if cur_node == goal:
                 break
-            try:
-                next_nodes = graph[cur_node]
-                for next_node in next_nodes:
-                    if next_node not in visited and next_node not in self.game.object_handler.npc_positions:
-                        queue.append(next_node)
-                        visited[next_node] = cur_node
-            except KeyError:
-                continue
+            for next_node in self.get_next_nodes(*cur_node):
+                if next_node not in visited and next_node not in self.game.object_handler.npc_positions:
+                    queue.append(next_node)
+                    visited[next_node] = cur_node
 
         return visited
 
-    def get_next_nodes(self, x, y):
-        return [(x + dx, y + dy) for dx, dy in self.ways if (x + dx, y + dy) not in self.game.map.world_map]
+    def get_walls(self, x0, y0, x1, y1):
+        """Wall flags of the tiles from (x0, y0) up to (x1, y1) row by row, the outer ring and tiles off the map as walls"""
+        tile_x, tile_y = (tiles.ravel() for tiles in np.meshgrid(np.arange(x0, x1), np.arange(y0, y1)))
+        walls = self.game.map.is_wall_array(tile_x, tile_y)
+        walls |= (tile_x < 0) | (tile_x >= self.cols) | (tile_y < 0) | (tile_y >= self.rows)
+        walls = walls.reshape(y1 - y0, x1 - x0)
+        walls[[0, -1]] = walls[:, [0, -1]] = True
+        return walls.ravel().tolist()
 
-    def get_graph(self):
-        for y, row in enumerate(self.map):
-            for x, col in enumerate(row):
-                if not col:
-                    self.graph[(x, y)] = self.graph.get((x, y), []) + self.get_next_nodes(x, y)
\ No newline at end of file
+    def is_floor(self, node):
+        x, y = node
+        return 0 <= x < self.cols and 0 <= y < self.rows and not self.game.map.is_wall(x, y)
+
+    def get_next_nodes(self, x, y):
+        """Floor tiles of the map one of the ways from (x, y)"""
+        is_wall, cols, rows = self.game.map.is_wall, self.cols, self.rows
+        return [(x + dx, y + dy) for dx, dy in self.ways
+                if 0 <= x + dx < cols and 0 <= y + dy < rows and not is_wall(x + dx, y + dy)]
@@ -10,13 +10,14 @@ class Player:
     """
     def __init__(self, game):
         self.game = game
-        self.x, self.y = PLAYER_POS
+        self.x, self.y = game.map.start_pos
         self.angle = PLAYER_ANGLE
+        self.prev_pose = self.sim_pose = self.x, self.y, self.angle  # for drawing between simulation steps
         self.shot = False
         self.rel = 0
         self.health = PLAYER_MAX_HEALTH
         self.health_recovery_delay = 700
-        self.time_prev = pg.time.get_ticks()
+        self.time_prev = game.time
         self.is_alive = True
         
         # Movement variables
@@ -123,7 +124,7 @@ class Player:
     def play_footstep_sounds(self):
         """Play footstep sounds based on movement"""
         speed = math.sqrt(self.velocity_x ** 2 + self.velocity_y ** 2)
-        current_time = pg.time.get_ticks()
+        current_time = self.game.time
         
         if speed > 0.1 and current_time - self.last_footstep > self.footstep_delay:
             self.last_footstep = current_time
@@ -146,7 +147,7 @@ class Player:
 
     def check_health_recovery_delay(self):
         """Check if enough time has passed for health recovery"""
-        time_now = pg.time.get_ticks()
+        time_now = self.game.time
         if time_now - self.time_prev > self.health_recovery_delay:
             self.time_prev = time_now
             return True
@@ -167,8 +168,7 @@ class Player:
 
     def is_targeting_enemy(self):
         """Check if player is aiming at an enemy"""
-        return any(npc.ray_cast_value and npc.alive 
-                  for npc in self.game.object_handler.npc_list)
+        return any(npc.ray_cast_value for npc in self.game.object_handler.npc_grid)
 
     def single_fire_event(self, event):
         """Handle shooting events with recoil and effects"""
@@ -195,7 +195,7 @@ class Player:
 
     def check_wall(self, x, y):
         """Check if position is walkable"""
-        return (x, y) not in self.game.map.world_map
+        return not self.game.map.is_wall(x, y)
 
     def mouse_control(self):
         """Handle mouse look with smooth movement"""
@@ -207,12 +207,25 @@ class Player:
         self.rel = max(-MOUSE_MAX_REL, min(MOUSE_MAX_REL, self.rel))
         self.angle += self.rel * MOUSE_SENSITIVITY * self.game.delta_time
 
+    def save_state(self):
+        """Remember the pose before a simulation step"""
+        self.prev_pose = self.x, self.y, self.angle
+
+    def interpolate(self, alpha):
+        """Take the pose alpha of the way from the previous step to the latest until restore"""
+        self.sim_pose = self.x, self.y, self.angle
+        self.x, self.y, self.angle = (prev + (value - prev) * alpha for prev, value in zip(self.prev_pose, self.sim_pose))
+
+    def restore(self):
+        self.x, self.y, self.angle = self.sim_pose
+
     def check_game_over(self):
         """Handle game over state"""
         if not self.is_alive:
-            self.game.object_renderer.game_over()
-            pg.display.flip()
-            pg.time.delay(1500)
+            if not self.game.headless:
+                self.game.object_renderer.game_over()
+                pg.display.flip()
+                pg.time.delay(1500)
             self.game.new_game()
 
     @property
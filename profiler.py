@@ -0,0 +1,135 @@
+import pygame as pg
+import numpy as np
+import json
+import time
+from settings import *
+
+
+class FrameProfiler:
+    """
+    Time spent in each stage of the last PROFILER_FRAMES frames, in a ring buffer. Stages are
+    timed by laps: a lap charges the time since the previous lap to its stage, so each stage
+    costs one clock read. Shown as a scrolling stacked frame time graph, exported as a Chrome
+    trace (chrome://tracing or ui.perfetto.dev).
+    """
+    STAGES = ('player', 'pathfinding', 'npcs', 'weapon', 'raycasting', 'projection', 'background',
+              'walls', 'sprites', 'minimap', 'hud', 'profiler', 'present')
+    COLORS = ((80, 160, 255), (0, 200, 200), (255, 90, 90), (255, 170, 0), (120, 220, 80), (200, 120, 255),
+              (110, 110, 170), (240, 240, 120), (255, 120, 200), (150, 150, 150), (255, 255, 255),
+              (90, 90, 90), (60, 130, 60))
+
+    def __init__(self, frames=PROFILER_FRAMES):
+        self.frames = frames
+        self.stage_ids = {stage: stage_id for stage_id, stage in enumerate(self.STAGES)}
+        self.stage_times = np.zeros((frames, len(self.STAGES)))  # milliseconds per stage per frame
+        self.frame_starts = np.zeros(frames)
+        self.frame_count = 0  # frames begun, the current one is in row frame_count % frames
+
+        # every lap, for trace export
+        capacity = frames * PROFILER_LAPS_PER_FRAME
+        self.lap_stages = np.zeros(capacity, dtype=np.int16)
+        self.lap_starts = np.zeros(capacity)
+        self.lap_durations = np.zeros(capacity)
+        self.lap_count = 0
+        self.time_origin = self.last_time = time.perf_counter()
+
+        # overlay, one column per frame scrolled left as frames complete
+        self.visible = PROFILER_OVERLAY
+        self.graph = pg.Surface((frames, PROFILER_GRAPH_HEIGHT), pg.SRCALPHA)
+        self.graph_frame = 0  # last frame drawn into the graph
+        self.font = pg.font.Font(None, 20)
+        self.legend = None
+
+    def begin_frame(self):
+        self.frame_count += 1
+        row = self.frame_count % self.frames
+        self.stage_times[row] = 0
+        self.frame_starts[row] = self.last_time = time.perf_counter()
+
+    def lap(self, stage):
+        """Charge the time since the last lap to stage"""
+        time_now = time.perf_counter()
+        duration = (time_now - self.last_time) * 1000
+        stage_id = self.stage_ids[stage]
+        self.stage_times[self.frame_count % self.frames, stage_id] += duration
+        index = self.lap_count % len(self.lap_stages)
+        self.lap_stages[index] = stage_id
+        self.lap_starts[index] = self.last_time
+        self.lap_durations[index] = duration
+        self.lap_count += 1
+        self.last_time = time_now
+
+    def get_rows(self):
+        """Ring rows of the completed frames still held, oldest first"""
+        first = max(1, self.frame_count - self.frames + 1)
+        return np.arange(first, self.frame_count) % self.frames
+
+    def toggle(self):
+        self.visible = not self.visible
+
+    def draw(self, screen):
+        """Stacked time per stage of recent frames, with lines at one and two frame budgets"""
+        frame_time = 1000 / FPS
+        pixels_per_ms = PROFILER_GRAPH_HEIGHT / (2 * frame_time)
+        new_frames = min(self.frame_count - 1 - self.graph_frame, self.frames)
+        if new_frames > 0:
+            self.graph.scroll(-new_frames, 0)
+            self.graph.fill((0, 0, 0, 160), (self.frames - new_frames, 0, new_frames, PROFILER_GRAPH_HEIGHT))
+            for column, frame in enumerate(range(self.frame_count - new_frames, self.frame_count)):
+                x, bottom = self.frames - new_frames + column, PROFILER_GRAPH_HEIGHT
+                for stage_time, color in zip(self.stage_times[frame % self.frames].tolist(), self.COLORS):
+                    height = stage_time * pixels_per_ms
+                    if height >= 0.5:
+                        pg.draw.line(self.graph, color, (x, bottom - 1), (x, max(0, round(bottom - height))))
+                    bottom -= height
+            self.graph_frame = self.frame_count - 1
+
+        if self.legend is None or self.frame_count % PROFILER_LEGEND_INTERVAL == 0:
+            self.legend = self.render_legend()
+
+        pos = 10, 10
+        screen.blit(self.graph, pos)
+        for budget in (frame_time, 2 * frame_time):
+            y = pos[1] + PROFILER_GRAPH_HEIGHT - round(budget * pixels_per_ms)
+            pg.draw.line(screen, (255, 60, 60), (pos[0], y), (pos[0] + self.frames - 1, y))
+        screen.blit(self.legend, (pos[0], pos[1] + PROFILER_GRAPH_HEIGHT + 4))
+
+    def render_legend(self):
+        """Mean milliseconds per stage over the buffer, and the frame rate"""
+        rows = self.get_rows()
+        means = self.stage_times[rows].mean(axis=0) if len(rows) else np.zeros(len(self.STAGES))
+        intervals = np.diff(self.frame_starts[rows]) if len(rows) > 1 else np.zeros(0)
+        fps = 1 / intervals.mean() if len(intervals) and intervals.mean() > 0 else 0
+        lines = [(f'{fps:.0f} FPS, {means.sum():.1f} ms', (255, 255, 255))]
+        lines += [(f'{stage} {mean:.2f}', color) for stage, mean, color in zip(self.STAGES, means, self.COLORS)]
+
+        columns = 2
+        line_height = self.font.get_linesize()
+        legend = pg.Surface((self.frames, line_height * (1 + -(-(len(lines) - 1) // columns))), pg.SRCALPHA)
+        legend.fill((0, 0, 0, 160))
+        legend.blit(self.font.render(lines[0][0], True, lines[0][1]), (2, 0))
+        for index, (text, color) in enumerate(lines[1:]):
+            x = 2 + index % columns * self.frames // columns
+            y = line_height * (1 + index // columns)
+            legend.blit(self.font.render(text, True, color), (x, y))
+        return legend
+
+    def export_trace(self, path):
+        """Write the laps still in the buffer as Chrome trace events, one slice per frame and per lap"""
+        rows = self.get_rows()
+        starts = self.frame_starts[rows]
+        events = [{'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': tid, 'args': {'name': name}}
+                  for tid, name in ((1, 'frames'), (2, 'stages'))]
+        events += [{'name': 'frame', 'ph': 'X', 'pid': 1, 'tid': 1, 'ts': (start - self.time_origin) * 1e6,
+                    'dur': (end - start) * 1e6} for start, end in zip(starts[:-1].tolist(), starts[1:].tolist())]
+
+        first = max(0, self.lap_count - len(self.lap_stages))
+        indices = np.arange(first, self.lap_count) % len(self.lap_stages)
+        for stage_id, start, duration in zip(self.lap_stages[indices].tolist(), self.lap_starts[indices].tolist(),
+                                             self.lap_durations[indices].tolist()):
+            events.append({'name': self.STAGES[stage_id], 'ph': 'X', 'pid': 1, 'tid': 2,
+                           'ts': (start - self.time_origin) * 1e6, 'dur': duration * 1000})
+
+        with open(path, 'w') as file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
+        return path
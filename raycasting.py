@@ -1,38 +1,130 @@
 import pygame as pg
 import math
+import numpy as np
 from settings import *
+from cache import SurfaceCache
+from framebuffer import FrameBuffer
 
 class RayCasting:
     def __init__(self, game):
         self.game = game
         self.ray_casting_result = []
         self.objects_to_render = []
+        self.walls_to_render = []
         self.textures = self.game.object_renderer.wall_textures
+        self.wall_cache = SurfaceCache(WALL_CACHE_MEMORY)
+        self.frame_buffer = FrameBuffer(game, self.textures) if WALL_RENDERER == 'framebuffer' else None
+        self.rays = np.arange(NUM_RAYS)
+        self.depth_buffer = np.full(NUM_RAYS, np.inf)  # perpendicular wall distance per ray
+        self.proj_height = np.zeros(NUM_RAYS)
+        self.texture = np.ones(NUM_RAYS, dtype=np.uint8)
+        self.offset = np.zeros(NUM_RAYS)
 
     def get_objects_to_render(self):
-        self.objects_to_render = []
+        self.walls_to_render = []
         for ray, values in enumerate(self.ray_casting_result):
             depth, proj_height, texture, offset = values
 
+            # quantize so neighbouring columns and frames share scaled surfaces
+            column = int(offset * (TEXTURE_SIZE - SCALE)) // WALL_CACHE_OFFSET_STEP * WALL_CACHE_OFFSET_STEP
+            proj_height = max(1, round(proj_height / WALL_CACHE_HEIGHT_STEP) * WALL_CACHE_HEIGHT_STEP)
+            wall_column = self.get_wall_column(texture, column, proj_height)
+
             if proj_height < HEIGHT:
-                wall_column = self.textures[texture].subsurface(
-                    offset * (TEXTURE_SIZE - SCALE), 0, SCALE, TEXTURE_SIZE
-                )
-                wall_column = pg.transform.scale(wall_column, (SCALE, proj_height))
                 wall_pos = (ray * SCALE, HALF_HEIGHT - proj_height // 2)
             else:
-                texture_height = TEXTURE_SIZE * HEIGHT / proj_height
-                wall_column = self.textures[texture].subsurface(
-                    offset * (TEXTURE_SIZE - SCALE), HALF_TEXTURE_SIZE - texture_height // 2,
-                    SCALE, texture_height
-                )
-                wall_column = pg.transform.scale(wall_column, (SCALE, HEIGHT))
                 wall_pos = (ray * SCALE, 0)
 
-            self.objects_to_render.append((depth, wall_column, wall_pos))
+            self.walls_to_render.append((wall_column, wall_pos))
+
+    def get_wall_column(self, texture, column, proj_height):
+        key = texture, column, proj_height
+        wall_column = self.wall_cache.get(key)
+        if wall_column is not None:
+            return wall_column
+
+        if proj_height < HEIGHT:
+            wall_column = self.textures[texture].subsurface(column, 0, SCALE, TEXTURE_SIZE)
+            wall_column = pg.transform.scale(wall_column, (SCALE, proj_height))
+        else:
+            texture_height = TEXTURE_SIZE * HEIGHT / proj_height
+            wall_column = self.textures[texture].subsurface(
+                column, HALF_TEXTURE_SIZE - texture_height // 2, SCALE, texture_height
+            )
+            wall_column = pg.transform.scale(wall_column, (SCALE, HEIGHT))
+        return self.wall_cache.put(key, wall_column)
+
+    def march(self, x, y, dx, dy, depth, delta_depth):
+        # step every ray at once, accumulating like the scalar loop so results match it
+        x = np.cumsum(np.column_stack((x, np.repeat(dx[:, None], MAX_DEPTH, axis=1))), axis=1)
+        y = np.cumsum(np.column_stack((y, np.repeat(dy[:, None], MAX_DEPTH, axis=1))), axis=1)
+        depth = np.cumsum(np.column_stack((depth, np.repeat(delta_depth[:, None], MAX_DEPTH, axis=1))), axis=1)
+
+        tile_x, tile_y = x[:, :MAX_DEPTH].astype(np.int64), y[:, :MAX_DEPTH].astype(np.int64)
+        texture = self.game.map.get_tiles(tile_x, tile_y)
+
+        # rays that never hit a wall end one step past the last probe, as the scalar loop does
+        hit = texture > 0
+        step = np.where(hit.any(axis=1), hit.argmax(axis=1), MAX_DEPTH)
+        texture = np.where(step < MAX_DEPTH, texture[self.rays, step.clip(0, MAX_DEPTH - 1)], 1)
+        return x[self.rays, step], y[self.rays, step], depth[self.rays, step], texture
 
     def ray_cast(self):
-        self.ray_casting_result = []
+        ox, oy = self.game.player.pos
+        x_map, y_map = self.game.player.map_pos
+
+        ray_angle = self.game.player.angle - HALF_FOV + 0.0001
+        ray_angles = np.cumsum(np.concatenate(([ray_angle], np.full(NUM_RAYS - 1, DELTA_ANGLE))))
+        sin_a = np.sin(ray_angles)
+        cos_a = np.cos(ray_angles)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            #horizontals
+            y_hor = np.where(sin_a > 0, y_map + 1, y_map - 1e-6)
+            dy = np.where(sin_a > 0, 1.0, -1.0)
+
+            depth_hor = (y_hor - oy) / sin_a
+            x_hor = ox + depth_hor * cos_a
+
+            delta_depth = dy / sin_a
+            dx = delta_depth * cos_a
+
+            x_hor, y_hor, depth_hor, texture_hor = self.march(x_hor, y_hor, dx, dy, depth_hor, delta_depth)
+
+            #verticals
+            x_vert = np.where(cos_a > 0, x_map + 1, x_map - 1e-6)
+            dx = np.where(cos_a > 0, 1.0, -1.0)
+
+            depth_vert = (x_vert - ox) / cos_a
+            y_vert = oy + depth_vert * sin_a
+
+            delta_depth = dx / cos_a
+            dy = delta_depth * sin_a
+
+            x_vert, y_vert, depth_vert, texture_vert = self.march(x_vert, y_vert, dx, dy, depth_vert, delta_depth)
+
+        # depth texture offset
+        vertical = depth_vert < depth_hor
+        depth = np.where(vertical, depth_vert, depth_hor)
+        texture = np.where(vertical, texture_vert, texture_hor)
+        y_vert %= 1
+        x_hor %= 1
+        offset = np.where(vertical,
+                          np.where(cos_a > 0, y_vert, 1 - y_vert),
+                          np.where(sin_a > 0, 1 - x_hor, x_hor))
+
+        # remove fishbowl effect
+        depth *= np.cos(self.game.player.angle - ray_angles)
+
+        # projection
+        proj_height = SCREEN_DIST / (depth + 0.0001)
+
+        # ray casting result
+        self.depth_buffer, self.proj_height, self.texture, self.offset = depth, proj_height, texture, offset
+        self.ray_casting_result = list(zip(depth.tolist(), proj_height.tolist(), texture.tolist(), offset.tolist()))
+
+    def ray_cast_scalar(self):
+        ray_casting_result = []
         ox, oy = self.game.player.pos
         x_map, y_map = self.game.player.map_pos
 
@@ -51,9 +143,8 @@ class RayCasting:
             dx = delta_depth * cos_a
 
             for i in range(MAX_DEPTH):
-                tile_hor = int(x_hor), int(y_hor)
-                if tile_hor in self.game.map.world_map:
-                    texture_hor = self.game.map.world_map[tile_hor]
+                texture_hor = self.game.map.get_tile(int(x_hor), int(y_hor))
+                if texture_hor:
                     break
                 x_hor += dx
                 y_hor += dy
@@ -69,9 +160,8 @@ class RayCasting:
             dy = delta_depth * sin_a
 
             for i in range(MAX_DEPTH):
-                tile_vert = int(x_vert), int(y_vert)
-                if tile_vert in self.game.map.world_map:
-                    texture_vert = self.game.map.world_map[tile_vert]
+                texture_vert = self.game.map.get_tile(int(x_vert), int(y_vert))
+                if texture_vert:
                     break
                 x_vert += dx
                 y_vert += dy
@@ -94,11 +184,17 @@ class RayCasting:
             proj_height = SCREEN_DIST / (depth + 0.0001)
 
             # ray casting result
-            self.ray_casting_result.append((depth, proj_height, texture, offset))
+            ray_casting_result.append((depth, proj_height, texture, offset))
 
             ray_angle += DELTA_ANGLE
 
+        return ray_casting_result
+
     def update(self):
         self.ray_cast()
-        self.get_objects_to_render()
+        self.objects_to_render = []
+        if self.frame_buffer:
+            self.frame_buffer.render(self.proj_height, self.texture, self.offset)
+        else:
+            self.get_objects_to_render()
 
@@ -11,6 +11,12 @@ HALF_WIDTH = WIDTH // 2
 HALF_HEIGHT = HEIGHT // 2
 FPS = 60  # Target frames per second
 
+# Simulation Settings
+SIM_HZ = 60  # Fixed game logic steps per second, independent of the rendered frame rate
+SIM_STEP = 1000 / SIM_HZ  # Milliseconds of game time per step
+SIM_MAX_STEPS = 5  # Steps caught up per rendered frame, time beyond that is dropped
+GLOBAL_EVENT_TIME = 40  # Milliseconds of game time between global game events
+
 # Player Settings
 PLAYER_POS = 1.5, 5  # Starting position (x, y)
 PLAYER_ANGLE = 0  # Starting angle (radians)
@@ -75,14 +81,76 @@ SCALE = WIDTH // NUM_RAYS  # Scaling factor for walls
 TEXTURE_SIZE = 256  # Size of wall textures
 HALF_TEXTURE_SIZE = TEXTURE_SIZE // 2
 
+# Wall Column Cache Settings
+WALL_CACHE_MEMORY = 64 * 1024 * 1024  # Memory budget for scaled wall columns in bytes
+WALL_CACHE_OFFSET_STEP = 1  # Texture columns per cached offset bucket
+WALL_CACHE_HEIGHT_STEP = 2  # Projected height pixels per cached height bucket
+
+# Sprite Cache Settings
+SPRITE_CACHE_MEMORY = 64 * 1024 * 1024  # Memory budget for scaled sprite frames in bytes
+SPRITE_CACHE_HEIGHT_STEP = 2  # Projected height pixels per cached sprite size
+
+# Asset Pack Settings
+ASSET_PACK = 'resources/assets.pack'  # Raw atlases written by pack_assets.py, PNGs are decoded if it is missing
+ASSET_PACK_ROOTS = ('resources/sprites', 'resources/textures')  # Folders whose PNGs are packed
+ASSET_PACK_PAGE_SIZE = 4096  # Atlas page width and maximum height in pixels
+
+# Asset Loader Settings
+ASSET_LOADER_WORKERS = 2  # Threads decoding images and sounds during the loading screen
+ASSET_LOADER_BUDGET = 8  # Milliseconds of main thread work per loading screen frame
+SOUND_PATH = 'resources/sound/'  # Sound effects, loaded with the images
+
+# Wall Renderer Settings
+WALL_RENDERER = 'columns'  # 'columns' blits one scaled surface per ray, 'framebuffer' one frame per draw
+WALL_COLOR_KEY = (255, 0, 255)  # Transparent color of the framebuffer outside walls
+WALL_BLOCK_WIDTH = 64  # Screen columns the framebuffer fills together, over the rows of their tallest wall
+
+# Profiler Settings
+PROFILER_FRAMES = 240  # Frames kept in the profiler's ring buffer, one overlay graph column each
+PROFILER_LAPS_PER_FRAME = 32  # Lap slots per frame kept for trace export
+PROFILER_GRAPH_HEIGHT = 100  # Overlay graph height in pixels, two frame budgets tall
+PROFILER_LEGEND_INTERVAL = 30  # Frames between refreshes of the overlay's stage averages
+PROFILER_OVERLAY = False  # Show the overlay from the start, F3 toggles it
+PROFILER_TRACE_PATH = 'trace_{time}.json'  # F4 writes the buffered frames here as Chrome trace events
+
 # Sound Settings
 MUSIC_VOLUME = 0.4  # Background music volume
 SFX_VOLUME = 0.6  # Sound effects volume
 FOOTSTEP_DELAY = 400  # Delay between footstep sounds
 WEAPON_VOLUME = 0.7  # Weapon sound volume
 
+# Map Settings
+MAP_CHUNK_SIZE = 64  # Tiles per side of a map chunk, a power of two, 64 makes each chunk one 4 KB page
+MAP_WINDOW_RADIUS = 1  # Chunks around the player's chunk held as one array, enough for MAX_DEPTH rays
+MAP_MAX_CHUNKS = 256  # Chunks of a map file held outside the window, the farthest from the player are evicted first
+
+# Pathfinding Settings
+PATHFINDING_MODE = 'flow_field'  # 'bfs', 'astar' or 'hierarchical' search per NPC, 'flow_field' shares one field
+PATHFINDING_MAX_EXPANSIONS = 4000  # A* gives up and heads for its closest node after this many expansions
+PATHFINDING_CLUSTER_SIZE = 16  # Tiles per side of a cluster in hierarchical mode
+PATHFINDING_FLOW_RADIUS = 48  # Tiles around the player the flow field covers, NPCs beyond it head straight for the player
+PATHFINDING_FLOW_BUDGET = 2.0  # Milliseconds of flow field building per frame, larger fields take several frames
+PATHFINDING_CLUSTER_BUDGET = 2.0  # Milliseconds of cluster building per frame in hierarchical mode
+SQRT_2 = math.sqrt(2)  # Diagonal step cost
+
+# Line of Sight Settings
+PVS_RAYS = 512  # Rays cast from each sample point of a tile when building its visibility row
+PVS_INSET = 0.05  # How far inside a tile's corners the sample points sit
+PVS_SOURCE_POINTS = 3  # Ray origins per side of a tile, in a grid between its inset corners
+PVS_STEP = 0.25  # Tiles between wall probes along a full-visibility line
+PVS_MAX_ROWS = 4096  # Source tiles whose visibility rows are kept in memory
+PVS_MARCH_STEPS = 8  # Grid lines a ray advances between checks for the wall it stops at
+PVS_BUILD_BUDGET = 2.0  # Milliseconds of visibility row building per frame, a row takes ~5 ms
+
+# AI Level of Detail Settings
+AI_LOD_NEAR = 8  # NPCs nearer than this, seeing the player or in pain use the first tier
+AI_LOD_FAR = 20  # NPCs nearer than this or chasing the player use the second tier, the rest the third
+AI_LOD_INTERVALS = (1, 4, 16)  # Frames between line of sight and path updates for each tier
+AI_THINK_BUDGET = 2.0  # Milliseconds per frame for line of sight and path updates
+AI_THINK_BATCH = 64  # NPCs updated per slice, the budget is checked between slices
+
 # Enemy Settings
-ENEMY_SPEED = 0.03  # Base enemy movement speed
+ENEMY_SPEED = 0.0018  # Base enemy movement speed, tiles per millisecond of game time
 ENEMY_ATTACK_DIST = 1.0  # Distance at which enemies can attack
 ENEMY_DAMAGE = 10  # Base enemy damage
 ENEMY_HEALTH = {
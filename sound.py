@@ -1,15 +1,17 @@
 import pygame as pg
+from assets import assets
+from settings import SOUND_PATH
 
 
 class Sound:
     def __init__(self, game):
         self.game = game
         pg.mixer.init()
-        self.path = 'resources/sound/'
-        self.shotgun = pg.mixer.Sound(self.path + 'shotgun.wav')
-        self.npc_pain = pg.mixer.Sound(self.path + 'npc_pain.wav')
-        self.npc_death = pg.mixer.Sound(self.path + 'npc_death.wav')
-        self.npc_shot = pg.mixer.Sound(self.path + 'npc_attack.wav')
-        self.player_pain = pg.mixer.Sound(self.path + 'player_pain.wav')
+        self.path = SOUND_PATH
+        self.shotgun = assets.get_sound(self.path + 'shotgun.wav')
+        self.npc_pain = assets.get_sound(self.path + 'npc_pain.wav')
+        self.npc_death = assets.get_sound(self.path + 'npc_death.wav')
+        self.npc_shot = assets.get_sound(self.path + 'npc_attack.wav')
+        self.player_pain = assets.get_sound(self.path + 'player_pain.wav')
         self.theme = pg.mixer.music.load(self.path + 'theme.mp3')
 
@@ -0,0 +1,72 @@
+class SpatialGrid:
+    """
+    Uniform grid of map tiles to the entities standing on them. An entity is only re-bucketed
+    when its tile changes, so occupancy and radius queries never scan the whole entity list.
+    """
+    def __init__(self):
+        self.cells = {}  # tile -> entities on it, empty cells are dropped
+        self.entity_tiles = {}  # entity -> tile it is bucketed under
+        self.version = 0  # bumped whenever the set of occupied tiles changes
+
+    def __len__(self):
+        return len(self.entity_tiles)
+
+    def __iter__(self):
+        return iter(self.entity_tiles)
+
+    def __contains__(self, entity):
+        return entity in self.entity_tiles
+
+    def add(self, entity):
+        tile = self.entity_tiles[entity] = entity.map_pos
+        self.add_to_cell(tile, entity)
+
+    def remove(self, entity):
+        tile = self.entity_tiles.pop(entity, None)
+        if tile is not None:
+            self.remove_from_cell(tile, entity)
+
+    def move(self, entity, tile=None):
+        """Re-bucket the entity if it changed tile since it was added or last moved"""
+        tile = entity.map_pos if tile is None else tile
+        old_tile = self.entity_tiles[entity]
+        if tile != old_tile:
+            self.remove_from_cell(old_tile, entity)
+            self.entity_tiles[entity] = tile
+            self.add_to_cell(tile, entity)
+
+    def add_to_cell(self, tile, entity):
+        cell = self.cells.get(tile)
+        if cell is None:
+            self.cells[tile] = [entity]
+            self.version += 1
+        else:
+            cell.append(entity)
+
+    def remove_from_cell(self, tile, entity):
+        cell = self.cells[tile]
+        cell.remove(entity)
+        if not cell:
+            del self.cells[tile]
+            self.version += 1
+
+    def is_occupied(self, tile):
+        return tile in self.cells
+
+    def get_at(self, tile):
+        return self.cells.get(tile, ())
+
+    def query_radius(self, x, y, radius):
+        """Entities within radius of (x, y), visiting whichever is fewer of the covered tiles or occupied ones"""
+        min_x, max_x = int(x - radius), int(x + radius)
+        min_y, max_y = int(y - radius), int(y + radius)
+        if (max_x - min_x + 1) * (max_y - min_y + 1) <= len(self.cells):
+            cells = [self.cells.get((tile_x, tile_y)) for tile_y in range(min_y, max_y + 1)
+                     for tile_x in range(min_x, max_x + 1)]
+        else:
+            cells = [cell for (tile_x, tile_y), cell in self.cells.items()
+                     if min_x <= tile_x <= max_x and min_y <= tile_y <= max_y]
+
+        radius_sq = radius * radius
+        return [entity for cell in cells if cell for entity in cell
+                if (entity.x - x) ** 2 + (entity.y - y) ** 2 <= radius_sq]
@@ -1,15 +1,20 @@
 import pygame as pg
+import numpy as np
 from settings import *
-import os
 from collections import deque
+from assets import assets
 
 class SpriteObject:
+    __slots__ = ('game', 'player', 'x', 'y', 'image', 'IMAGE_WIDTH', 'IMAGE_HALF_WIDTH', 'IMAGE_RATIO',
+                 'dx', 'dy', 'theta', 'screen_x', 'dist', 'norm_dist', 'sprite_half_width',
+                 'SPRITE_SCALE', 'SPRITE_HEIGHT_SHIFT')
+
     def __init__(self, game, path='resources/sprites/static_sprites/candlebar.png',
                  pos=(10.5, 3.5), scale=0.5, shift=0.27):
         self.game = game
         self.player = game.player
         self.x, self.y = pos
-        self.image = pg.image.load(path).convert_alpha()
+        self.image = assets.get_image(path)
         self.IMAGE_WIDTH = self.image.get_width()
         self.IMAGE_HALF_WIDTH = self.image.get_width() // 2
         self.IMAGE_RATIO = self.IMAGE_WIDTH / self.image.get_height()
@@ -20,15 +25,62 @@ class SpriteObject:
 
     def get_sprite_projection(self):
         proj = SCREEN_DIST / self.norm_dist * self.SPRITE_SCALE
+        proj = max(1, round(proj / SPRITE_CACHE_HEIGHT_STEP) * SPRITE_CACHE_HEIGHT_STEP)
         proj_width, proj_height = proj * self.IMAGE_RATIO, proj
 
-        image = pg.transform.scale(self.image, (proj_width, proj_height))
-
         self.sprite_half_width = proj_width // 2
         height_shift = proj_height * self.SPRITE_HEIGHT_SHIFT
-        pos = self.screen_x - self.sprite_half_width, HALF_HEIGHT - proj_height //2 + height_shift
-
-        self.game.raycasting.objects_to_render.append((self.norm_dist, image, pos))
+        left, top = self.screen_x - self.sprite_half_width, HALF_HEIGHT - proj_height //2 + height_shift
+
+        spans = self.get_visible_spans(left, proj_width)
+        if not spans:
+            return
+        if proj_height > HEIGHT:
+            self.get_clipped_projection(spans, left, top, proj_width, proj_height)
+            return
+
+        # sprites that fit on screen are scaled whole once and shared through the cache
+        image = self.get_scaled_image(int(proj_width), proj_height)
+        for span_left, span_right in spans:
+            area = pg.Rect(span_left - left, 0, span_right - span_left, proj_height)
+            self.game.raycasting.objects_to_render.append((self.norm_dist, image, (span_left, top), area))
+
+    def get_scaled_image(self, width, height):
+        sprite_cache = self.game.object_handler.sprite_cache
+        key = self.image, width, height
+        image = sprite_cache.get(key)
+        if image is None:
+            image = sprite_cache.put(key, pg.transform.scale(self.image, (width, height)))
+        return image
+
+    def get_clipped_projection(self, spans, left, top, proj_width, proj_height):
+        """Scales only the on-screen rows of the visible spans of a sprite taller than the screen"""
+        visible_top, visible_bottom = max(top, 0), min(top + proj_height, HEIGHT)
+        if visible_bottom - visible_top < 1:
+            return
+        image_width, image_height = self.image.get_size()
+        image_top = int((visible_top - top) / proj_height * image_height)
+        image_bottom = max(image_top + 1, min(image_height, math.ceil((visible_bottom - top) / proj_height * image_height)))
+
+        for span_left, span_right in spans:
+            image_left = int((span_left - left) / proj_width * image_width)
+            image_right = max(image_left + 1, min(image_width, math.ceil((span_right - left) / proj_width * image_width)))
+            image = self.image.subsurface(image_left, image_top, image_right - image_left, image_bottom - image_top)
+            image = pg.transform.scale(image, (span_right - span_left, visible_bottom - visible_top))
+            self.game.raycasting.objects_to_render.append((self.norm_dist, image, (span_left, visible_top), None))
+
+    def get_visible_spans(self, left, width):
+        """Screen x ranges of [left, left + width) that are not behind a nearer wall"""
+        first_ray = max(0, int(left) // SCALE)
+        last_ray = min(NUM_RAYS, int(left + width) // SCALE + 1)
+        if first_ray >= last_ray:
+            return []
+        depth_buffer = self.game.raycasting.depth_buffer[first_ray:last_ray]
+        visible = np.concatenate(([False], depth_buffer > self.norm_dist, [False]))
+        edges = np.flatnonzero(visible[1:] != visible[:-1]) + first_ray
+        spans = [(max(start * SCALE, left), min(end * SCALE, left + width))
+                 for start, end in zip(edges[::2], edges[1::2])]
+        return [(span_left, span_right) for span_left, span_right in spans if span_right - span_left >= 1]
 
     def get_sprite(self):
         dx = self.x - self.player.x
@@ -50,20 +102,26 @@ class SpriteObject:
 
     def update(self):
         self.get_sprite()
+        self.update_logic()
+
+    def update_logic(self):
+        """Per-frame work that does not depend on the projection, run after it"""
+        pass
 
 
 class AnimatedSprites(SpriteObject):
+    __slots__ = ('animation_time', 'path', 'images', 'animation_time_prev', 'animation_trigger')
+
     def __init__(self, game, path='resources/sprites/animated_sprites/green_light/0.png',
                  pos=(11.5, 3.5), scale=0.8, shift=0.15, animation_time=120):
         super().__init__(game, path, pos, scale, shift)
         self.animation_time = animation_time
         self.path = path.rsplit('/', 1)[0]
         self.images = self.get_images(self.path)
-        self.animation_time_prev = pg.time.get_ticks()
+        self.animation_time_prev = game.time
         self.animation_trigger = False
 
-    def update(self):
-        super().update()
+    def update_logic(self):
         self.check_animation_time()
         self.animate(self.images)
 
@@ -74,15 +132,11 @@ class AnimatedSprites(SpriteObject):
 
     def check_animation_time(self):
         self.animation_trigger = False
-        time_now = pg.time.get_ticks()
+        time_now = self.game.time
         if time_now - self.animation_time_prev > self.animation_time:
             self.animation_time_prev = time_now
             self.animation_trigger = True
 
     def get_images(self, path):
-        images = deque()
-        for file_name in os.listdir(path):
-            if os.path.isfile(os.path.join(path, file_name)):
-                img = pg.image.load(path + '/' + file_name).convert_alpha()
-                images.append(img)
-        return images
\ No newline at end of file
+        # the frames are shared, only the rotation of this deque is the sprite's own
+        return deque(assets.get_sequence(path))
\ No newline at end of file
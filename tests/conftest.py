@@ -0,0 +1,31 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ['SDL_VIDEODRIVER'] = 'dummy'
+os.environ['SDL_AUDIODRIVER'] = 'dummy'
+
+
+@pytest.fixture
+def game():
+    # resource paths are relative to the repository root
+    os.chdir(ROOT)
+    from main import Game
+    return Game(headless=True)
+
+
+@pytest.fixture
+def make_game():
+    """Headless games on a given level, like the game fixture's on the shipped one"""
+    os.chdir(ROOT)
+    from main import Game
+    return lambda level: Game(headless=True, level=level)
+
+
+@pytest.fixture
+def floor(game):
+    """Floor tiles of the game's map, row by row"""
+    return [(x, y) for y in range(game.map.rows) for x in range(game.map.cols) if not game.map.is_wall(x, y)]
@@ -0,0 +1,20 @@
+import os
+
+import pytest
+
+from assets import AssetPack
+from settings import ASSET_PACK
+
+
+def test_packed_images_are_writable(game):
+    if not os.path.exists(ASSET_PACK):
+        pytest.skip('no asset pack, run pack_assets.py')
+    pack = AssetPack(ASSET_PACK)
+    folder, frames = next(iter(pack.index['folders'].items()))
+    image = pack.get_image(f'{folder}/{next(iter(frames))}')
+    assert image is not None
+    image.fill((255, 0, 0))
+    image.set_at((0, 0), (0, 255, 0))
+    assert image.get_at((1, 0))[:3] == (255, 0, 0)
+    with open(ASSET_PACK, 'rb') as file:
+        assert file.read(8) == b'DHPACK01'
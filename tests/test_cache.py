@@ -0,0 +1,33 @@
+import random
+from collections import OrderedDict
+
+import pygame as pg
+
+from cache import SurfaceCache
+
+
+def test_cache_stays_within_max_bytes_evicting_least_recently_used():
+    rng = random.Random(0)
+    cache = SurfaceCache(max_bytes=32 * 1024)
+    expected = OrderedDict()  # key -> size, least recently used first
+    for _ in range(2000):
+        key = rng.randrange(40)
+        if rng.random() < 0.5:
+            surface = cache.get(key)
+            assert (surface is None) == (key not in expected)
+            if surface is not None:
+                expected.move_to_end(key)
+        else:
+            # a few surfaces are too large to cache at all
+            surface = pg.Surface((rng.choice([4, 16, 64, 160]), rng.randrange(1, 64)))
+            size = SurfaceCache.get_size(surface)
+            assert cache.put(key, surface) is surface
+            if size <= cache.max_bytes:
+                expected.pop(key, None)
+                expected[key] = size
+                while sum(expected.values()) > cache.max_bytes:
+                    expected.popitem(last=False)
+
+        assert cache.bytes == sum(expected.values()) <= cache.max_bytes
+        assert list(cache.surfaces) == list(expected)
+    assert cache.evictions
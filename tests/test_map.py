@@ -0,0 +1,27 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+import map as map_module
+from map import Map, generate_map, save_map
+
+
+def test_pool_stays_within_max_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(map_module, 'MAP_MAX_CHUNKS', 3)
+    level = generate_map(200, 150, seed=2)
+    path = str(tmp_path / 'level.map')
+    save_map(path, level, chunk_size=16)
+    game_map = Map(SimpleNamespace(), path)
+    expected = np.asarray(level)
+
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        # lookups spread over many chunks at once, then single tiles
+        xs = rng.integers(-2, 202, 40).astype(np.int32)
+        ys = rng.integers(-2, 152, 40).astype(np.int32)
+        inside = (xs >= 0) & (xs < 200) & (ys >= 0) & (ys < 150)
+        tiles = game_map.get_tiles(xs, ys)
+        assert (tiles[inside] == expected[ys[inside], xs[inside]]).all() and not tiles[~inside].any()
+        assert len(game_map.pool) <= 3
+        x, y = int(rng.integers(200)), int(rng.integers(150))
+        assert game_map.get_tile(x, y) == expected[y, x]
@@ -0,0 +1,34 @@
+import math
+import random
+
+import numpy as np
+
+import npc_store as npc_store_module
+from npc import SoldierNPC
+from settings import SIM_STEP
+
+
+def test_every_due_npc_thinks_within_bounded_updates(game, floor, monkeypatch):
+    # a budget spent by the first slice, so every update lets a single slice think
+    monkeypatch.setattr(npc_store_module, 'AI_THINK_BUDGET', 0.0)
+    monkeypatch.setattr(npc_store_module, 'AI_THINK_BATCH', 8)
+    rng = random.Random(0)
+    object_handler = game.object_handler
+    object_handler.clear()
+    game.player.health = float('inf')
+    for x, y in rng.sample(floor, 100):
+        object_handler.add_npc(SoldierNPC(game, pos=(x + rng.uniform(0.2, 0.8), y + rng.uniform(0.2, 0.8))))
+    store = object_handler.npc_store
+    store.player_search_trigger[:store.count] = True
+
+    # due NPCs think oldest first, so one waits behind at most every other NPC
+    bound = math.ceil(store.count / 8)
+    for _ in range(300):
+        game.time += SIM_STEP
+        game.pathfinding.update()
+        object_handler.project_sprites(draw=False)
+        object_handler.update()
+        assert store.thought <= 8
+        alive = np.flatnonzero(store.alive[:store.count])
+        waited = store.frame_number - store.next_think[alive]
+        assert waited.max() < bound
@@ -0,0 +1,123 @@
+import math
+import random
+from heapq import heappop, heappush
+
+import pathfinding as pathfinding_module
+from map import generate_map
+from settings import PATHFINDING_FLOW_RADIUS, SQRT_2
+
+
+def test_hierarchical_path_steps_to_a_neighbour(game, floor):
+    rng = random.Random(0)
+    pathfinding = game.pathfinding
+    pathfinding.build_hierarchy()
+    for _ in range(2000):
+        start, goal = rng.sample(floor, 2)
+        game.object_handler.npc_positions = set(rng.sample(floor, 60)) - {start, goal}
+        step = pathfinding.get_hierarchical_path(start, goal)
+        # A* heads straight for a goal it cannot reach
+        assert step in pathfinding.get_next_nodes(*start) or step == goal
+
+
+def get_depths(pathfinding, goal):
+    """Steps from goal to every tile the game's BFS reaches from it"""
+    visited = pathfinding.bfs(goal, None)
+    depths = {goal: 0}
+    for node in visited:
+        chain = []
+        while node not in depths:
+            chain.append(node)
+            node = visited[node]
+        for step in reversed(chain):
+            depths[step] = depths[node] + 1
+            node = step
+    return depths
+
+
+def test_flow_field_steps_match_bfs(game, floor):
+    rng = random.Random(0)
+    pathfinding = game.pathfinding
+    for _ in range(20):
+        goal = rng.choice(floor)
+        blocked = set(rng.sample(floor, 60)) - {goal}
+        game.object_handler.npc_positions = blocked
+        for _ in pathfinding.build_flow_field(goal, blocked):
+            pass
+        depths = get_depths(pathfinding, goal)
+
+        x0, y0, x1, y1 = pathfinding.flow_rect
+        for x, y in floor:
+            dist = pathfinding.flow_dist[(y - y0) * (x1 - x0) + x - x0]
+            if (x, y) in depths:
+                assert dist == depths[x, y]
+            elif (x, y) not in blocked:
+                # BFS leaves out occupied tiles, which the field reaches but does not pass through
+                assert dist == -1
+
+
+def test_flow_field_covers_the_tiles_around_its_goal(make_game):
+    game = make_game(generate_map(160, 160, seed=1))
+    pathfinding = game.pathfinding
+    goal = next((x, y) for y in range(80, 160) for x in range(80, 160) if pathfinding.is_floor((x, y)))
+    for _ in pathfinding.build_flow_field(goal, set()):
+        pass
+    depths = get_depths(pathfinding, goal)
+
+    x0, y0, x1, y1 = pathfinding.flow_rect
+    assert x1 - x0 <= 2 * PATHFINDING_FLOW_RADIUS + 3 and y1 - y0 <= 2 * PATHFINDING_FLOW_RADIUS + 3
+    for (x, y), depth in depths.items():
+        # a path of at most PATHFINDING_FLOW_RADIUS steps stays within the field
+        if depth <= PATHFINDING_FLOW_RADIUS:
+            assert pathfinding.flow_dist[(y - y0) * (x1 - x0) + x - x0] == depth
+
+
+def get_costs(pathfinding, goal, blocked):
+    """Dijkstra's cost from every tile it reaches to goal, over the 8 ways without entering blocked tiles"""
+    costs = {goal: 0.0}
+    heap = [(0.0, goal)]
+    while heap:
+        cost, node = heappop(heap)
+        if cost > costs[node]:
+            continue
+        for next_node in pathfinding.get_next_nodes(*node):
+            next_cost = cost + (SQRT_2 if next_node[0] != node[0] and next_node[1] != node[1] else 1.0)
+            if next_node not in blocked and next_cost < costs.get(next_node, math.inf):
+                costs[next_node] = next_cost
+                heappush(heap, (next_cost, next_node))
+    return costs
+
+
+def test_astar_paths_match_dijkstra(game, floor):
+    rng = random.Random(0)
+    pathfinding = game.pathfinding
+    for _ in range(200):
+        start, goal = rng.sample(floor, 2)
+        blocked = set(rng.sample(floor, 60)) - {start, goal}
+        game.object_handler.npc_positions = blocked
+        costs = get_costs(pathfinding, goal, blocked)
+
+        step = pathfinding.get_astar_path(start, goal)
+        if start not in costs:
+            assert step == goal
+            continue
+        assert math.isclose(pathfinding.g_cost[goal[1] * pathfinding.cols + goal[0]], costs[start])
+        # the step is the first of a cheapest path
+        step_cost = SQRT_2 if step[0] != start[0] and step[1] != start[1] else 1.0
+        assert step in pathfinding.get_next_nodes(*start) and step not in blocked
+        assert math.isclose(step_cost + costs[step], costs[start])
+
+
+def test_astar_stops_after_max_expansions(game, floor, monkeypatch):
+    monkeypatch.setattr(pathfinding_module, 'PATHFINDING_MAX_EXPANSIONS', 20)
+    rng = random.Random(0)
+    pathfinding = game.pathfinding
+    game.object_handler.npc_positions = set()
+    truncated = 0
+    for _ in range(200):
+        start, goal = rng.sample(floor, 2)
+        step = pathfinding.get_astar_path(start, goal)
+        assert pathfinding.expanded <= 20
+        truncated += pathfinding.expanded == 20
+        # cut off searches head for the node closest to the goal
+        assert step in pathfinding.get_next_nodes(*start) or step == goal
+    assert truncated
@@ -0,0 +1,19 @@
+import math
+import random
+
+import pytest
+
+
+def test_ray_cast_matches_scalar(game, floor):
+    rng = random.Random(0)
+    raycasting = game.raycasting
+    for _ in range(300):
+        x, y = rng.choice(floor)
+        game.player.x, game.player.y = x + rng.uniform(0.05, 0.95), y + rng.uniform(0.05, 0.95)
+        game.player.angle = rng.uniform(0, math.tau)
+        raycasting.ray_cast()
+        expected = raycasting.ray_cast_scalar()
+        assert len(raycasting.ray_casting_result) == len(expected)
+        for (depth, proj_height, texture, offset), scalar in zip(raycasting.ray_casting_result, expected):
+            assert (depth, proj_height, offset) == pytest.approx(scalar[:2] + scalar[3:], rel=1e-9, abs=1e-9)
+            assert texture == scalar[2]
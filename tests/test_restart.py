@@ -0,0 +1,45 @@
+import pygame as pg
+
+from map import generate_map
+
+BACKGROUND = (1, 2, 3)
+
+
+def is_drawn(screen, layer):
+    """True if the screen shows layer over a BACKGROUND fill"""
+    expected = pg.Surface(screen.get_size())
+    expected.fill(BACKGROUND)
+    expected.blit(layer.surface, layer.pos)
+    return (pg.surfarray.array3d(screen) == pg.surfarray.array3d(expected)).all()
+
+
+def test_game_over_screen_drawn_after_every_death(game):
+    for death in range(3):
+        game.player.health = 0
+        game.player.is_alive = False
+        game.screen.fill(BACKGROUND)
+        game.object_renderer.game_over()
+        assert is_drawn(game.screen, game.object_renderer.hud.layers['game_over']), \
+            f'game over screen not drawn after death {death + 1}'
+        game.new_game()
+
+
+def test_victory_screen_drawn_after_restart(game):
+    for _ in range(2):
+        game.is_victory = True
+        game.screen.fill(BACKGROUND)
+        game.object_renderer.victory()
+        assert is_drawn(game.screen, game.object_renderer.hud.layers['victory'])
+        game.new_game()
+
+
+def test_new_game_on_another_level(game):
+    game.new_game(generate_map(48, 40, seed=1))
+    assert (game.map.cols, game.map.rows) == (48, 40)
+    assert game.map.visibility.map is game.map
+    assert (game.pathfinding.cols, game.pathfinding.rows) == (48, 40)
+    assert not game.map.is_wall(*game.player.map_pos)
+    for _ in range(10):
+        game.object_handler.project_sprites(draw=False)
+        game.update()
+    game.draw()
@@ -0,0 +1,40 @@
+import random
+
+from spatial_grid import SpatialGrid
+
+
+class Entity:
+    def __init__(self, x, y):
+        self.x, self.y = x, y
+
+    @property
+    def map_pos(self):
+        return int(self.x), int(self.y)
+
+
+def test_query_radius_matches_a_linear_scan():
+    rng = random.Random(0)
+    grid = SpatialGrid()
+    entities = [Entity(rng.uniform(0, 40), rng.uniform(0, 40)) for _ in range(300)]
+    for entity in entities:
+        grid.add(entity)
+
+    for _ in range(500):
+        # entities wander, leave and come back between queries
+        for entity in rng.sample(entities, 30):
+            entity.x = min(max(entity.x + rng.uniform(-2, 2), 0), 39.99)
+            entity.y = min(max(entity.y + rng.uniform(-2, 2), 0), 39.99)
+            if entity in grid:
+                grid.move(entity)
+        for entity in rng.sample(entities, 5):
+            if entity in grid:
+                grid.remove(entity)
+            else:
+                grid.add(entity)
+
+        # small radii visit the covered tiles, large ones the occupied tiles
+        x, y, radius = rng.uniform(0, 40), rng.uniform(0, 40), rng.choice([0.5, 1.5, 3, 8, 30])
+        expected = {id(entity) for entity in entities
+                    if entity in grid and (entity.x - x) ** 2 + (entity.y - y) ** 2 <= radius ** 2}
+        found = grid.query_radius(x, y, radius)
+        assert len(found) == len(expected) and {id(entity) for entity in found} == expected
@@ -0,0 +1,51 @@
+import random
+
+import numpy as np
+
+
+def place_at_random(game, rng, floor):
+    """Put the player and every NPC at random points of floor tiles, facing the NPCs like project_sprites"""
+    store = game.object_handler.npc_store
+    indices = np.arange(store.count)
+    x, y = rng.choice(floor)
+    game.player.x, game.player.y = x + rng.uniform(0.05, 0.95), y + rng.uniform(0.05, 0.95)
+    for index in indices:
+        x, y = rng.choice(floor)
+        store.x[index], store.y[index] = x + rng.uniform(0.05, 0.95), y + rng.uniform(0.05, 0.95)
+    # one NPC on the player's own tile
+    store.x[0], store.y[0] = int(game.player.x) + rng.uniform(0.05, 0.95), int(game.player.y) + rng.uniform(0.05, 0.95)
+    store.theta[indices] = np.arctan2(store.y[indices] - game.player.y, store.x[indices] - game.player.x)
+    return indices
+
+
+def test_update_builds_the_rows_around_the_player(game, floor):
+    visibility = game.map.visibility
+    assert not visibility.rows
+    for _ in range(200):
+        game.map.update()
+        if visibility.built_around == game.player.map_pos:
+            break
+    x, y = game.player.map_pos
+    around = [(x + dx, y + dy) for dy in (-1, 0, 1) for dx in (-1, 0, 1) if (x + dx, y + dy) in floor]
+    assert all(visibility.get_row(tile) is not None for tile in around)
+    # each row is two bitsets over the square of tiles within reach of its source
+    assert all(bits.nbytes == -(-visibility.side ** 2 // 8) for row in visibility.rows.values() for bits in row)
+
+
+def test_line_of_sight_is_ray_cast_until_the_row_is_built(game, floor):
+    rng = random.Random(0)
+    store, visibility = game.object_handler.npc_store, game.map.visibility
+    visibility.rows.clear()
+    for _ in range(20):
+        indices = place_at_random(game, rng, floor)
+        expected = np.array([store.npcs[index].ray_cast_player_npc() for index in indices])
+        assert expected[0]
+        assert (store.check_line_of_sight(indices) == expected).all()
+        assert visibility.get_row(game.player.map_pos) is None
+
+    # update builds the player's row a slice per call
+    for _ in range(100):
+        game.map.update()
+        if visibility.get_row(game.player.map_pos) is not None:
+            break
+    assert visibility.get_row(game.player.map_pos) is not None
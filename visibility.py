@@ -0,0 +1,183 @@
+import numpy as np
+import time
+from collections import OrderedDict
+from settings import *
+
+
+class VisibilitySet:
+    """
+    Potentially visible set between map tiles for line-of-sight checks. A source tile's row
+    holds two bitsets over the square of tiles within reach of it: tiles some ray from inside the
+    source reaches, up to the first wall, and tiles whose whole sight line to the source is clear.
+    update builds the rows around the player a slice per frame into a bounded LRU, and until the
+    player's row is done line of sight is ray cast.
+    """
+    def __init__(self, game_map):
+        self.map = game_map
+        self.rows = OrderedDict()  # source tile id -> (potentially visible bits, fully visible bits)
+        self.max_rows = PVS_MAX_ROWS
+        self.radius = MAX_DEPTH + 1  # rays from inside a tile reach no further than this many tiles out
+        self.side = 2 * self.radius + 1  # of the square a row covers, centred on its source
+        self.row_build = None  # row being built a slice per frame, added to the rows when done
+        self.built_around = None  # player tile whose neighbourhood has every row
+
+        self.corners = np.array([[PVS_INSET, PVS_INSET], [1 - PVS_INSET, PVS_INSET],
+                                 [1 - PVS_INSET, 1 - PVS_INSET], [PVS_INSET, 1 - PVS_INSET]])
+
+        # a fan of rays from a grid of points spanning the source tile, PVS_RAYS per point
+        grid = np.linspace(PVS_INSET, 1 - PVS_INSET, PVS_SOURCE_POINTS)
+        points = np.stack(np.meshgrid(grid, grid), axis=-1).reshape(-1, 2)
+        angles = (np.arange(PVS_RAYS) + 0.5) * math.tau / PVS_RAYS
+        self.ray_x = np.repeat(points[:, 0], PVS_RAYS).astype(np.float32)
+        self.ray_y = np.repeat(points[:, 1], PVS_RAYS).astype(np.float32)
+        self.ray_sin = np.tile(np.sin(angles), len(points)).astype(np.float32)
+        self.ray_cos = np.tile(np.cos(angles), len(points)).astype(np.float32)
+        self.steps = np.arange(MAX_DEPTH + 1, dtype=np.float32)
+
+    def test_tiles(self, source, tile_x, tile_y):
+        """
+        Masks of (visible, undecided) for arrays of target tiles seen from source. Every target
+        is undecided while the source's row is not built.
+        """
+        row = self.get_row(source)
+        if row is None:
+            return np.zeros(len(tile_x), dtype=bool), np.ones(len(tile_x), dtype=bool)
+        potentially_visible, fully_visible = row
+        local_x, local_y = tile_x - (source[0] - self.radius), tile_y - (source[1] - self.radius)
+        inside = (local_x >= 0) & (local_x < self.side) & (local_y >= 0) & (local_y < self.side)
+        local_ids = np.where(inside, local_y * self.side + local_x, 0)
+        # bits are packed most significant first, as np.packbits does
+        byte_ids, shifts = local_ids >> 3, 7 - (local_ids & 7)
+        visible = (fully_visible[byte_ids] >> shifts & 1).astype(bool) & inside
+        # the rays stop at MAX_DEPTH, so beyond it hidden means unknown
+        far = (tile_x - source[0]) ** 2 + (tile_y - source[1]) ** 2 >= MAX_DEPTH ** 2
+        return visible, ~visible & ((potentially_visible[byte_ids] >> shifts & 1).astype(bool) & inside | far)
+
+    def get_row(self, source):
+        source_id = source[1] * self.map.cols + source[0]
+        row = self.rows.get(source_id)
+        if row is not None:
+            self.rows.move_to_end(source_id)
+        return row
+
+    def update(self):
+        """Build the missing rows of the player's tile and the tiles next to it within PVS_BUILD_BUDGET"""
+        player_tile = self.map.game.player.map_pos
+        if self.row_build is None and player_tile == self.built_around:
+            return
+        time_start = time.perf_counter()
+        while True:
+            if self.row_build is None:
+                source = self.get_missing_row(player_tile)
+                if source is None:
+                    self.built_around = player_tile
+                    return
+                self.row_build = self.build_row(source)
+            for _ in self.row_build:
+                if (time.perf_counter() - time_start) * 1000 > PVS_BUILD_BUDGET:
+                    return
+            self.row_build = None
+
+    def get_missing_row(self, tile):
+        """The player's tile, or else a floor tile next to it, that has no row yet"""
+        x, y = tile
+        for source in [(x + dx, y + dy) for dy in (0, -1, 1) for dx in (0, -1, 1)]:
+            if (0 <= source[0] < self.map.cols and 0 <= source[1] < self.map.rows and
+                    source[1] * self.map.cols + source[0] not in self.rows and not self.map.is_wall(*source)):
+                return source
+        return None
+
+    def build_row(self, source):
+        """
+        Work out the row of a source tile and add it to the rows, pausing after each slice of
+        PVS_RAYS rays and of 128 target tiles. Rays and sight lines look walls up in
+        the square of tiles the row covers, as 0 for floor, 1 for wall and 2 off the map.
+        """
+        left, top = source[0] - self.radius, source[1] - self.radius
+        tile_x, tile_y = (tiles.ravel() for tiles in
+                          np.meshgrid(np.arange(left, left + self.side), np.arange(top, top + self.side)))
+        cells = self.map.is_wall_array(tile_x, tile_y).view(np.uint8)
+        cells[(tile_x < 0) | (tile_x >= self.map.cols) | (tile_y < 0) | (tile_y >= self.map.rows)] = 2
+
+        potentially_visible = np.zeros(self.side ** 2, dtype=bool)
+        potentially_visible[self.radius * self.side + self.radius] = True
+        for start in range(0, len(self.ray_x), PVS_RAYS):
+            potentially_visible[self.get_potentially_visible(cells, slice(start, start + PVS_RAYS))] = True
+            yield
+
+        tiles = np.flatnonzero(potentially_visible)
+        line_x, line_y = tiles % self.side - self.radius, tiles // self.side - self.radius
+        samples = int(np.ceil(np.hypot(line_x, line_y).max() / PVS_STEP)) + 1
+        fully_visible = np.zeros_like(potentially_visible)
+        for start in range(0, len(tiles), 128):
+            batch = slice(start, start + 128)
+            fully_visible[tiles[batch]] = self.get_fully_visible(cells, line_x[batch], line_y[batch], samples)
+            yield
+
+        self.rows[source[1] * self.map.cols + source[0]] = np.packbits(potentially_visible), np.packbits(fully_visible)
+        if len(self.rows) > self.max_rows:
+            self.rows.popitem(last=False)
+
+    def get_potentially_visible(self, cells, rays):
+        """
+        Ids in a row's square of the tiles a slice of the fan's rays enter up to the wall they
+        stop at, like the ray caster's DDA, given the square's cells as 0 for floor, 1 for wall and
+        2 off the map. Rays advance PVS_MARCH_STEPS grid lines at a time and stop at their first wall.
+        """
+        side, radius = self.side, np.float32(self.radius)
+        ox, oy = radius + self.ray_x[rays], radius + self.ray_y[rays]
+        sin_a, cos_a = self.ray_sin[rays], self.ray_cos[rays]
+        count = len(ox)
+
+        # every ray is marched over the horizontal and then the vertical grid lines: at a step it
+        # is in tile a_tile along the axis it crosses, at depth, and at b along the other axis
+        a_start = np.hstack((np.where(sin_a > 0, radius + 1, radius - np.float32(1e-4)),
+                             np.where(cos_a > 0, radius + 1, radius - np.float32(1e-4))))
+        a_step = np.hstack((np.where(sin_a > 0, 1, -1), np.where(cos_a > 0, 1, -1))).astype(np.int32)
+        a_sin, b_cos = np.hstack((sin_a, cos_a)), np.hstack((cos_a, sin_a))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            depth_start = (a_start - np.hstack((oy, ox))) / a_sin
+            depth_step = a_step.astype(np.float32) / a_sin
+        b_start, b_step = np.hstack((ox, oy)) + depth_start * b_cos, depth_step * b_cos
+        # ids in the square, row by row: a is y for the horizontals and x for the verticals
+        b_scale = np.where(np.arange(2 * count) < count, 1, side).astype(np.int32)
+        id_start, id_step = a_start.astype(np.int32) * (side + 1 - b_scale), a_step * (side + 1 - b_scale)
+
+        lines = np.arange(2 * count)
+        wall_depth = np.full(2 * count, np.inf, dtype=np.float32)
+        marched = []
+        with np.errstate(invalid='ignore'):
+            for start in range(0, MAX_DEPTH + 1, PVS_MARCH_STEPS):
+                steps = self.steps[start:start + PVS_MARCH_STEPS]
+                depth = depth_start[lines, None] + depth_step[lines, None] * steps
+                # beyond MAX_DEPTH the tile does not matter, so clipping keeps it in the square
+                b = (b_start[lines, None] + b_step[lines, None] * steps).clip(0, side - 1).astype(np.int32)
+                tiles = id_start[lines, None] + id_step[lines, None] * steps.astype(np.int32) + b * b_scale[lines, None]
+                cell = cells.take(tiles)
+                walls = cell == 1
+                np.putmask(depth, cell == 2, np.inf)
+                wall_depth[lines] = np.where(walls, depth, np.inf).min(axis=1)
+                marched.append((lines, depth, tiles))
+                # a ray past MAX_DEPTH or the map edge gets no further in
+                lines = lines[~walls.any(axis=1) & (depth[:, -1] <= MAX_DEPTH)]
+                if not len(lines):
+                    break
+
+        # the wall a ray stops at counts too, NPCs can stand inside wall tiles
+        reach = np.minimum(np.minimum(wall_depth[:count], wall_depth[count:]), MAX_DEPTH)
+        reach = np.hstack((reach, reach))
+        return np.concatenate([tiles[depth <= reach[lines, None]] for lines, depth, tiles in marched])
+
+    def get_fully_visible(self, cells, line_x, line_y, samples):
+        """
+        Mask of tiles, given by their offsets from the source, whose lines from each inset corner
+        of the source to the same corner of the tile are clear at every one of samples points.
+        Those lines are less than a tile apart, so no wall fits between them.
+        """
+        line_x = line_x.astype(np.float32)[:, None, None]
+        line_y = line_y.astype(np.float32)[:, None, None]
+        t = np.linspace(-1, 0, samples, dtype=np.float32)
+        corners = (self.radius + self.corners).astype(np.float32)
+        sample_x = (corners[:, 0, None] + line_x + line_x * t).astype(np.int32)
+        sample_y = (corners[:, 1, None] + line_y + line_y * t).astype(np.int32)
+        return ~(cells.take(sample_y * self.side + sample_x) == 1).any(axis=(1, 2))
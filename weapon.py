@@ -11,9 +11,8 @@ class Weapon(AnimatedSprites):
         super().__init__(game=game, path=path, scale=scale, animation_time=animation_time)
         
         # Weapon images and positioning
-        self.images = deque(
-            [pg.transform.smoothscale(img, (self.image.get_width() * scale, self.image.get_height() * scale))
-             for img in self.images])
+        size = self.image.get_width() * scale, self.image.get_height() * scale
+        self.images = deque(assets.get_sequence(self.path, size, smooth=True))
         self.weapon_pos = (HALF_WIDTH - self.images[0].get_width() // 2, HEIGHT - self.images[0].get_height())
         self.weapon_base_pos = self.weapon_pos  # Store base position for weapon sway
         
@@ -53,6 +52,10 @@ class Weapon(AnimatedSprites):
         self.flash_start_time = 0
         self.shell_ejection_counter = 0
 
+        # Ammo counter HUD layer, only re-rendered when the counts change
+        self.font = pg.font.Font(None, 36)
+        self.game.object_renderer.hud.add_layer('ammo', self.render_ammo_counter)
+
     def update(self):
         """Update weapon state each frame"""
         self.check_animation_time()
@@ -90,7 +93,7 @@ class Weapon(AnimatedSprites):
     def update_muzzle_flash(self):
         """Handle muzzle flash effect"""
         if self.muzzle_flash_active:
-            if pg.time.get_ticks() - self.flash_start_time > self.muzzle_flash_duration:
+            if self.game.time - self.flash_start_time > self.muzzle_flash_duration:
                 self.muzzle_flash_active = False
 
     def check_reload_state(self):
@@ -130,7 +133,7 @@ class Weapon(AnimatedSprites):
 
     def shoot(self):
         """Handle shooting mechanics"""
-        current_time = pg.time.get_ticks()
+        current_time = self.game.time
         if (not self.reloading and self.current_ammo > 0 and 
             current_time - self.last_shot_time > self.shot_delay):
             
@@ -167,10 +170,10 @@ class Weapon(AnimatedSprites):
 
     def draw_ammo_counter(self):
         """Draw ammunition counter HUD"""
-        ammo_text = f"{self.current_ammo}/{self.total_ammo}"
-        font = pg.font.Font(None, 36)
-        text_surface = font.render(ammo_text, True, (255, 255, 255))
-        self.game.screen.blit(text_surface, (WIDTH - 100, HEIGHT - 50))
+        self.game.object_renderer.hud.draw('ammo', (WIDTH - 100, HEIGHT - 50), self.current_ammo, self.total_ammo)
+
+    def render_ammo_counter(self, current_ammo, total_ammo):
+        return self.font.render(f"{current_ammo}/{total_ammo}", True, (255, 255, 255))
 
     def get_damage(self, distance):
         """Calculate damage based on distance"""